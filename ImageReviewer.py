@@ -1,7 +1,5 @@
 import sys
 import os
-import json
-from collections import OrderedDict
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout,
     QCheckBox, QPushButton, QScrollArea, QMessageBox, QMainWindow
@@ -10,6 +8,8 @@ from PyQt6.QtGui import QPixmap
 from PyQt6.QtCore import Qt
 from PIL import Image
 
+from report import load_report
+
 
 class ImagePanel(QWidget):
     """Widget showing one image, info, and selection checkbox."""
@@ -78,8 +78,7 @@ class MainWindow(QMainWindow):
         self.setMinimumSize(1200, 600)
 
         # Load JSON
-        with open(json_path, "r", encoding="utf-8") as f:
-            data = json.load(f, object_pairs_hook=OrderedDict)
+        data = load_report(json_path)
 
         self.image_groups = list(data.values())
         self.total_groups = len(self.image_groups)
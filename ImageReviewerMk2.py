@@ -1,7 +1,5 @@
 import sys
 import os
-import json
-from collections import OrderedDict
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout,
     QCheckBox, QPushButton, QScrollArea, QMessageBox, QMainWindow
@@ -10,6 +8,8 @@ from PyQt6.QtGui import QPixmap, QKeySequence, QShortcut, QFont
 from PyQt6.QtCore import Qt
 from PIL import Image
 
+from report import load_report
+
 
 def format_file_size(bytes_size):
     """Convert bytes to a human-readable string."""
@@ -98,8 +98,7 @@ class MainWindow(QMainWindow):
         self.setMinimumSize(1200, 600)
 
         # Load JSON
-        with open(json_path, "r", encoding="utf-8") as f:
-            data = json.load(f, object_pairs_hook=OrderedDict)
+        data = load_report(json_path)
 
         self.image_groups = list(data.values())
         self.total_groups = len(self.image_groups)
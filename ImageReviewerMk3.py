@@ -1,15 +1,20 @@
 import sys
 import os
-import json
+import io
 from collections import OrderedDict
 from PyQt6.QtWidgets import (
     QApplication, QWidget, QLabel, QVBoxLayout, QHBoxLayout,
-    QCheckBox, QPushButton, QScrollArea, QMessageBox, QMainWindow
+    QCheckBox, QPushButton, QScrollArea, QMessageBox, QMainWindow,
+    QListView, QComboBox, QSpinBox, QLineEdit, QFormLayout
 )
-from PyQt6.QtGui import QPixmap, QKeySequence, QShortcut, QFont
-from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QPixmap, QKeySequence, QShortcut, QFont, QImage, QPainter, QColor
+from PyQt6.QtCore import Qt, QObject, QRunnable, QThreadPool, QRectF, QAbstractListModel, pyqtSignal
 from PIL import Image
 
+from report import load_report_table
+from archives import split_member, open_member, read_members
+from tiles import TileSource, diff_overlay, shared_cache
+
 
 def format_file_size(bytes_size):
     """Convert bytes to a human-readable string."""
@@ -23,9 +28,10 @@ def format_file_size(bytes_size):
 
 class ImagePanel(QWidget):
     """Widget showing one image, info, and selection checkbox."""
-    def __init__(self, image_path):
+    def __init__(self, image_path, data=None):
         super().__init__()
         self.image_path = image_path
+        self.data = data          # bytes of an archive member, read by MainWindow.load_group
         self.layout = QVBoxLayout()
         self.setLayout(self.layout)
 
@@ -66,25 +72,40 @@ class ImagePanel(QWidget):
 
     def update_display(self):
         """Refresh the image and its metadata."""
-        if not os.path.exists(self.image_path):
+        # Images inside a zip/tar (archive.zip!/member.jpg) are read from the archive
+        is_member = split_member(self.image_path)[1] is not None
+        if not os.path.exists(split_member(self.image_path)[0]):
             self.image_label.setText("❌ Image deleted")
             self.info_label.setText("")
             return
 
-        pixmap = QPixmap(self.image_path)
+        # Members are read once and used for the pixmap, the size and the header
+        data = None
+        if is_member:
+            try:
+                data = self.data if self.data is not None else open_member(self.image_path).getvalue()
+            except Exception:
+                data = b""
+            self.data = None
+
+        pixmap = QPixmap()
+        if is_member:
+            pixmap.loadFromData(data)
+        else:
+            pixmap.load(self.image_path)
         if pixmap.width() > 800:
             pixmap = pixmap.scaledToWidth(800, Qt.TransformationMode.SmoothTransformation)
         self.image_label.setPixmap(pixmap)
 
         try:
-            file_size = os.path.getsize(self.image_path)
+            file_size = len(data) if is_member else os.path.getsize(self.image_path)
             readable_size = format_file_size(file_size)
         except Exception:
             readable_size = "Unknown"
 
         try:
             from PIL import Image
-            with Image.open(self.image_path) as img:
+            with Image.open(io.BytesIO(data) if is_member else self.image_path) as img:
                 size = img.size
                 dpi = img.info.get("dpi", ("N/A", "N/A"))
         except Exception:
@@ -105,6 +126,9 @@ class ImagePanel(QWidget):
         return self.checkbox.isChecked()
 
     def delete_image(self):
+        if split_member(self.image_path)[1] is not None:
+            QMessageBox.information(self, "Archive member", f"{self.image_path}\nis inside an archive and was not deleted.")
+            return
         if os.path.exists(self.image_path):
             try:
                 os.remove(self.image_path)
@@ -124,6 +148,249 @@ class ImagePanel(QWidget):
 
 
 
+class _RenderSignals(QObject):
+    finished = pyqtSignal(int, object, object)   # generation, rect, [QImage per pane]
+
+
+class _RenderTask(QRunnable):
+    """Render the visible region of every source off the GUI thread."""
+    def __init__(self, generation, sources, rect, size, show_diff):
+        super().__init__()
+        self.generation = generation
+        self.sources = sources
+        self.rect = rect
+        self.size = size
+        self.show_diff = show_diff
+        self.signals = _RenderSignals()
+
+    def run(self):
+        images = []
+        for source in self.sources:
+            try:
+                images.append(source.render(self.rect, self.size)[0])
+            except Exception:
+                images.append(Image.new("RGB", self.size, (80, 0, 0)))
+        if self.show_diff and len(images) == 2:
+            images[1] = diff_overlay(images[0], images[1])
+        qimages = []
+        for img in images:
+            data = img.tobytes()
+            qimages.append(QImage(data, img.width, img.height, 3 * img.width,
+                                  QImage.Format.Format_RGB888).copy())
+        try:
+            self.signals.finished.emit(self.generation, self.rect, qimages)
+        except RuntimeError:
+            pass    # window closed while rendering
+
+
+class ZoomPane(QWidget):
+    """One side of the comparison view; forwards wheel/drag to the window."""
+    def __init__(self, compare, title):
+        super().__init__()
+        self.compare = compare
+        self.title = title
+        self.image = None
+        self.image_rect = None
+        self.drag_pos = None
+        self.setMinimumSize(300, 300)
+
+    def set_image(self, image, rect):
+        self.image = image
+        self.image_rect = rect
+        self.update()
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.fillRect(self.rect(), QColor(48, 48, 48))
+        if self.image is not None:
+            # Draw the last render where it sits in the current view, so pan/zoom
+            # feel immediate while the sharper render is still being decoded
+            x0, y0, x1, y1 = self.compare.view_rect()
+            ix0, iy0, ix1, iy1 = self.image_rect
+            sx, sy = self.width() / (x1 - x0), self.height() / (y1 - y0)
+            target = QRectF((ix0 - x0) * sx, (iy0 - y0) * sy, (ix1 - ix0) * sx, (iy1 - iy0) * sy)
+            painter.drawImage(target, self.image)
+        painter.setPen(QColor(255, 255, 255))
+        painter.drawText(8, 18, self.title)
+        painter.end()
+
+    def wheelEvent(self, event):
+        factor = 1.25 if event.angleDelta().y() > 0 else 1 / 1.25
+        pos = event.position()
+        self.compare.zoom_at(factor, pos.x() / self.width(), pos.y() / self.height())
+
+    def mousePressEvent(self, event):
+        if event.button() == Qt.MouseButton.LeftButton:
+            self.drag_pos = event.position()
+
+    def mouseMoveEvent(self, event):
+        if self.drag_pos is not None:
+            pos = event.position()
+            self.compare.pan(pos.x() - self.drag_pos.x(), pos.y() - self.drag_pos.y())
+            self.drag_pos = pos
+
+    def mouseReleaseEvent(self, event):
+        self.drag_pos = None
+
+    def resizeEvent(self, event):
+        self.compare.request_render()
+        super().resizeEvent(event)
+
+
+class CompareWindow(QWidget):
+    """Synchronised zoom/pan of two images, decoding only the visible tiles.
+
+    Wheel: zoom at cursor | Drag: pan | D: difference overlay | F: fit | 1: 100% | Esc: close
+    """
+    def __init__(self, path_a, path_b):
+        super().__init__()
+        self.setWindowTitle(f"Compare - {os.path.basename(path_a)} / {os.path.basename(path_b)}")
+        self.setMinimumSize(1000, 600)
+        self.sources = [TileSource(path_a), TileSource(path_b)]
+        self.center = (0.5, 0.5)
+        self.zoom = None              # screen pixels per pixel of the first image (None = fit)
+        self.show_diff = False
+        self.generation = 0
+        self.busy = False
+        self.dirty = False
+        self.tasks = {}
+
+        layout = QVBoxLayout(self)
+        panes = QHBoxLayout()
+        self.panes = [ZoomPane(self, path_a), ZoomPane(self, path_b)]
+        for pane in self.panes:
+            panes.addWidget(pane)
+        layout.addLayout(panes, stretch=1)
+        self.status_label = QLabel()
+        self.status_label.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        layout.addWidget(self.status_label)
+
+        QShortcut(QKeySequence(Qt.Key.Key_D), self, activated=self.toggle_diff)
+        QShortcut(QKeySequence(Qt.Key.Key_F), self, activated=self.fit)
+        QShortcut(QKeySequence(Qt.Key.Key_1), self, activated=self.actual_size)
+        QShortcut(QKeySequence(Qt.Key.Key_Plus), self, activated=lambda: self.zoom_at(1.25, 0.5, 0.5))
+        QShortcut(QKeySequence(Qt.Key.Key_Minus), self, activated=lambda: self.zoom_at(1 / 1.25, 0.5, 0.5))
+        QShortcut(QKeySequence(Qt.Key.Key_Escape), self, activated=self.close)
+
+    def fit_zoom(self):
+        pane = self.panes[0]
+        w, h = self.sources[0].size
+        return min(max(1, pane.width()) / w, max(1, pane.height()) / h)
+
+    def current_zoom(self):
+        return self.zoom if self.zoom is not None else self.fit_zoom()
+
+    def view_rect(self):
+        """Visible region as fractions (x0, y0, x1, y1) of the images."""
+        pane = self.panes[0]
+        w, h = self.sources[0].size
+        zoom = self.current_zoom()
+        rw, rh = max(1, pane.width()) / (zoom * w), max(1, pane.height()) / (zoom * h)
+        cx, cy = self.center
+        return (cx - rw / 2, cy - rh / 2, cx + rw / 2, cy + rh / 2)
+
+    def zoom_at(self, factor, fx, fy):
+        """Zoom by factor keeping the point at (fx, fy) of the pane still."""
+        x0, y0, x1, y1 = self.view_rect()
+        px, py = x0 + fx * (x1 - x0), y0 + fy * (y1 - y0)
+        self.zoom = min(16.0, max(self.fit_zoom() / 4, self.current_zoom() * factor))
+        x0, y0, x1, y1 = self.view_rect()
+        self.center = (px - (fx - 0.5) * (x1 - x0), py - (fy - 0.5) * (y1 - y0))
+        self.refresh()
+
+    def pan(self, dx, dy):
+        w, h = self.sources[0].size
+        zoom = self.current_zoom()
+        self.center = (self.center[0] - dx / (zoom * w), self.center[1] - dy / (zoom * h))
+        self.refresh()
+
+    def fit(self):
+        self.zoom = None
+        self.center = (0.5, 0.5)
+        self.refresh()
+
+    def actual_size(self):
+        self.zoom_at(1.0 / self.current_zoom(), 0.5, 0.5)
+
+    def toggle_diff(self):
+        self.show_diff = not self.show_diff
+        self.request_render()
+
+    def refresh(self):
+        for pane in self.panes:
+            pane.update()
+        self.request_render()
+
+    def request_render(self):
+        """Start a background render, coalescing requests while one is running."""
+        if self.busy:
+            self.dirty = True
+            return
+        pane = self.panes[0]
+        if pane.width() < 2 or pane.height() < 2:
+            return
+        self.busy, self.dirty = True, False
+        self.generation += 1
+        task = _RenderTask(self.generation, self.sources, self.view_rect(),
+                           (pane.width(), pane.height()), self.show_diff)
+        task.signals.finished.connect(self.on_rendered)
+        self.tasks[self.generation] = task
+        QThreadPool.globalInstance().start(task)
+
+    def on_rendered(self, generation, rect, images):
+        self.tasks.pop(generation, None)
+        self.busy = False
+        for pane, image in zip(self.panes, images):
+            pane.set_image(image, rect)
+        self.update_status()
+        if self.dirty:
+            self.request_render()
+
+    def update_status(self):
+        zoom = self.current_zoom()
+        levels = [s.level_for_scale(zoom * self.sources[0].size[0] / s.size[0]) for s in self.sources]
+        self.status_label.setText(
+            f"Zoom {zoom * 100:.0f}% | pyramid levels {levels} | tile cache "
+            f"{shared_cache.bytes / (1024 * 1024):.0f} MB | diff {'on' if self.show_diff else 'off'} "
+            "(wheel: zoom | drag: pan | D: diff | F: fit | 1: 100%)"
+        )
+
+
+# Sort choices for the review queue: label -> index into a group's stats (None = report order)
+QUEUE_SORTS = OrderedDict([
+    ("Reclaimable space", 2),
+    ("Total size", 1),
+    ("Most copies", 0),
+    ("Highest resolution", 5),
+    ("Report order", None),
+])
+
+
+class GroupQueueModel(QAbstractListModel):
+    """Virtual list of the queued groups; rows are formatted only when shown."""
+    def __init__(self, window):
+        super().__init__()
+        self.window = window
+        self.order = []
+
+    def set_order(self, order):
+        self.beginResetModel()
+        self.order = order
+        self.endResetModel()
+
+    def rowCount(self, parent=None):
+        return len(self.order)
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if role != Qt.ItemDataRole.DisplayRole or not index.isValid():
+            return None
+        members, total, reclaimable, width, height = self.window.group_stats[self.order[index.row()]][:5]
+        text = f"{index.row() + 1}. {members} files · {format_file_size(reclaimable)} reclaimable"
+        if width:
+            text += f" · {width}x{height}"
+        return text
+
+
 class MainWindow(QMainWindow):
     """Main window managing image groups and user actions."""
     def __init__(self, json_path):
@@ -131,18 +398,59 @@ class MainWindow(QMainWindow):
         self.setWindowTitle("Image Review Tool")
         self.setMinimumSize(1200, 600)
 
-        # Load JSON
-        with open(json_path, "r", encoding="utf-8") as f:
-            data = json.load(f, object_pairs_hook=OrderedDict)
-
-        self.image_groups = list(data.values())
-        self.total_groups = len(self.image_groups)
+        # Load JSON (paths stay as ids in the report's path table until a group is opened)
+        self.table, groups, stats = load_report_table(json_path)
+
+        self.image_groups = list(groups.values())
+        # Per-group [members, total bytes, reclaimable bytes, max width, max height, max pixels]
+        self.group_stats = []
+        for key, ids in groups.items():
+            row = list(stats.get(key) or [len(ids), 0, 0, 0, 0])
+            self.group_stats.append(row + [row[3] * row[4]])
+        self.queue = list(range(len(self.image_groups)))
+        self.total_groups = len(self.queue)
         self.current_group_index = 0
 
         # --- Layout setup ---
         self.main_widget = QWidget()
         self.setCentralWidget(self.main_widget)
-        self.layout = QVBoxLayout(self.main_widget)
+        outer = QHBoxLayout(self.main_widget)
+
+        # Review queue: sorted/filtered list of groups built from the report stats only
+        queue_panel = QWidget()
+        queue_panel.setFixedWidth(360)
+        queue_layout = QVBoxLayout(queue_panel)
+        queue_layout.setContentsMargins(0, 0, 0, 0)
+        filters = QFormLayout()
+        self.sort_box = QComboBox()
+        self.sort_box.addItems(QUEUE_SORTS.keys())
+        if not stats:
+            self.sort_box.setCurrentText("Report order")
+        self.min_reclaim_box = QSpinBox()
+        self.min_reclaim_box.setRange(0, 1_000_000)
+        self.min_reclaim_box.setSuffix(" MB")
+        self.min_members_box = QSpinBox()
+        self.min_members_box.setRange(2, 1_000_000)
+        self.path_filter = QLineEdit()
+        self.path_filter.setPlaceholderText("path contains…")
+        filters.addRow("Sort by", self.sort_box)
+        filters.addRow("Min reclaimable", self.min_reclaim_box)
+        filters.addRow("Min copies", self.min_members_box)
+        filters.addRow("Filter", self.path_filter)
+        queue_layout.addLayout(filters)
+        self.queue_model = GroupQueueModel(self)
+        self.queue_view = QListView()
+        self.queue_view.setUniformItemSizes(True)
+        self.queue_view.setModel(self.queue_model)
+        self.queue_view.clicked.connect(lambda index: self.load_group(index.row()))
+        queue_layout.addWidget(self.queue_view)
+        self.queue_label = QLabel()
+        queue_layout.addWidget(self.queue_label)
+        outer.addWidget(queue_panel)
+
+        review_widget = QWidget()
+        outer.addWidget(review_widget, stretch=1)
+        self.layout = QVBoxLayout(review_widget)
 
         # Scrollable container for image panels
         self.scroll = QScrollArea()
@@ -159,10 +467,13 @@ class MainWindow(QMainWindow):
         self.prev_button.clicked.connect(self.prev_group)
         self.delete_button = QPushButton("🗑 Delete Selected")
         self.delete_button.clicked.connect(self.delete_selected)
+        self.compare_button = QPushButton("🔍 Compare")
+        self.compare_button.clicked.connect(self.compare_selected)
         self.next_button = QPushButton("Next Group ➡")
         self.next_button.clicked.connect(self.next_group)
         button_layout.addWidget(self.prev_button)
         button_layout.addWidget(self.delete_button)
+        button_layout.addWidget(self.compare_button)
         button_layout.addWidget(self.next_button)
         self.layout.addLayout(button_layout)
 
@@ -175,10 +486,37 @@ class MainWindow(QMainWindow):
         QShortcut(QKeySequence(Qt.Key.Key_Left), self, activated=self.prev_group)
         QShortcut(QKeySequence(Qt.Key.Key_Right), self, activated=self.next_group)
         QShortcut(QKeySequence(Qt.Key.Key_Delete), self, activated=self.delete_selected)
+        QShortcut(QKeySequence(Qt.Key.Key_C), self, activated=self.compare_selected)
 
         # Load first group
         self.panels = []
-        self.load_group(self.current_group_index)
+        self.compare_window = None
+        self.sort_box.currentTextChanged.connect(self.rebuild_queue)
+        self.min_reclaim_box.valueChanged.connect(self.rebuild_queue)
+        self.min_members_box.valueChanged.connect(self.rebuild_queue)
+        self.path_filter.editingFinished.connect(self.rebuild_queue)
+        self.rebuild_queue()
+
+    def rebuild_queue(self):
+        """Sort and filter the groups by their precomputed stats (no file access)."""
+        min_bytes = self.min_reclaim_box.value() * 1024 * 1024
+        min_members = self.min_members_box.value()
+        text = self.path_filter.text().strip().lower()
+        queue = [i for i, st in enumerate(self.group_stats) if st[2] >= min_bytes and st[0] >= min_members]
+        if text:
+            queue = [i for i in queue if any(text in self.table.path(f).lower() for f in self.image_groups[i])]
+        field = QUEUE_SORTS[self.sort_box.currentText()]
+        if field is not None:
+            queue.sort(key=lambda i: self.group_stats[i][field], reverse=True)
+
+        self.queue = queue
+        self.total_groups = len(queue)
+        self.queue_model.set_order(queue)
+        reclaimable = sum(self.group_stats[i][2] for i in queue)
+        self.queue_label.setText(f"{len(queue)} of {len(self.image_groups)} groups · "
+                                 f"{format_file_size(reclaimable)} reclaimable")
+        self.current_group_index = 0
+        self.load_group(0)
 
     def clear_group(self):
         """Remove all image panels."""
@@ -189,12 +527,20 @@ class MainWindow(QMainWindow):
         self.panels.clear()
 
     def load_group(self, index):
-        """Load images for the specified group index."""
+        """Load images for the group at the specified queue position."""
         self.clear_group()
-        image_list = self.image_groups[index]
+        self.current_group_index = index
+        if not self.queue:
+            self.update_status()
+            self.update_button_states()
+            return
+        image_list = [self.table.path(i) for i in self.image_groups[self.queue[index]]]
+        self.queue_view.setCurrentIndex(self.queue_model.index(index))
 
+        # Archive members of the group: each archive is read once for all of them
+        member_data = dict(read_members([p for p in image_list if split_member(p)[1] is not None]))
         for path in image_list:
-            panel = ImagePanel(path)
+            panel = ImagePanel(path, member_data.pop(path, None))
             self.hbox.addWidget(panel)
             self.panels.append(panel)
 
@@ -217,6 +563,17 @@ class MainWindow(QMainWindow):
             for panel in selected_panels:
                 panel.delete_image()
 
+    def compare_selected(self):
+        """Open the zoom/compare view for the two selected images (or the first two)."""
+        selected = [p for p in self.panels if p.is_selected()]
+        candidates = selected if len(selected) >= 2 else self.panels
+        paths = [p.image_path for p in candidates if os.path.exists(p.image_path)][:2]
+        if len(paths) < 2:
+            QMessageBox.information(self, "Info", "Need two existing images to compare.")
+            return
+        self.compare_window = CompareWindow(*paths)
+        self.compare_window.show()
+
     def next_group(self):
         """Move to the next group."""
         if self.current_group_index + 1 < self.total_groups:
@@ -235,10 +592,14 @@ class MainWindow(QMainWindow):
 
     def update_status(self):
         """Update window title and bottom label."""
+        if not self.queue:
+            self.setWindowTitle("Image Review Tool")
+            self.status_label.setText("No groups match the current filters.")
+            return
         self.setWindowTitle(f"Image Review Tool - Group {self.current_group_index + 1}/{self.total_groups}")
         self.status_label.setText(
             f"Viewing Group {self.current_group_index + 1} of {self.total_groups} "
-            "(←: Prev | →: Next | Del: Delete Selected)"
+            "(←: Prev | →: Next | Del: Delete Selected | C: Compare)"
         )
 
     def update_button_states(self):
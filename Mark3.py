@@ -1,102 +1,262 @@
 import os
 import csv
 import json
-import imagehash
-from PIL import Image
-from tqdm import tqdm
+from functools import partial
 from collections import defaultdict
 from multiprocessing import Pool, cpu_count
 
+from hashing import hash_with_time, check_hash_params, VALID_EXTS
+from archives import ARCHIVE_WALK_EXTS, is_archive, split_member, archive_stamp, known_sizes, remember_sizes
+from path_table import PathTable
+from report import save_report
+
 # --- CONFIGURATION ---
 IMAGE_DIR = "E:/Pictures"
 #IMAGE_DIR = "test-data"
-HASH_FUNC = imagehash.phash  # options: average_hash, phash, dhash, whash
+HASH_NAME = "phash"          # options: average_hash, phash, dhash, whash
 HASH_SIZE = 16               # 8 or 16 is common
 HAMMING_TOLERANCE = 0        # 0 = exact, 1–3 for near-duplicates
+VERIFY_GROUPS = False        # confirm groups with SSIM on cached thumbnails (see verify.py)
 #N_PROCESSES = max(1, cpu_count() - 1)
 N_PROCESSES = 20
+N_READERS = 4                # read-ahead disk readers feeding the workers, 0 = workers read files themselves
+SCAN_ARCHIVES = True         # also hash images inside .zip/.tar archives (as archive.zip!/member.jpg)
+THUMBS_DIR = "thumbs"        # 64x64 grayscale thumbnails kept while hashing for verify.py (4 KB each), None = off
 HASH_CACHE_FILE = "image_hashes.json"
 #DUPLICATES_CSV_FILE = "duplicates.csv"
 DUPLICATES_FILE = "duplicates.json"
+CACHE_VERSION = 2            # 2 = path table + hash list, 1 = {path: hash}
 
-# --- FUNCTION TO COMPUTE HASH ---
-def compute_hash(image_path):
-    try:
-        with Image.open(image_path) as img:
-            img_hash = HASH_FUNC(img, hash_size=HASH_SIZE)
-            #print (img_hash)
-        return (image_path, str(img_hash))
-    except Exception:
-        return (image_path, None)
 
-def load_cached_hashes():
-    if os.path.exists(HASH_CACHE_FILE):
-        with open(HASH_CACHE_FILE, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
+def _load_cache(cache_file, hash_name=None, hash_size=None):
+    """Return (PathTable, hashes, {archive path: [mtime, size, member sizes]}, capture times, algorithm).
 
+    algorithm is the [hash name, hash size] the cache was built with (None if
+    it predates recording it). Given hash_name and hash_size, a cache built
+    with anything else raises HashMismatch.
+    """
+    if not os.path.exists(cache_file):
+        return PathTable(), [], {}, [], None
+    with open(cache_file, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    if data.get("version") == CACHE_VERSION:
+        hashes = data["hashes"]
+        algorithm = [data["hash"], data["hash_size"]] if "hash" in data else None
+        if hash_name is not None:
+            check_hash_params(cache_file, algorithm, hashes, hash_name, hash_size)
+        stamps = data.get("archives", {})
+        for path, stamp in stamps.items():
+            if len(stamp) > 2:
+                remember_sizes(path, stamp[2])
+        return PathTable.from_json(data), hashes, stamps, data.get("times", [None] * len(hashes)), algorithm
+    # Old cache: {path: hash}
+    table = PathTable()
+    hashes = []
+    for path, h in data.items():
+        table.add(path)
+        hashes.append(h)
+    if hash_name is not None:
+        check_hash_params(cache_file, None, hashes, hash_name, hash_size)
+    return table, hashes, {}, [None] * len(hashes), None
 
-def save_cached_hashes(cache):
-    with open(HASH_CACHE_FILE, "w", encoding="utf-8") as f:
-        json.dump(cache, f, indent=2)
 
+def load_cached_hashes(cache_file=HASH_CACHE_FILE, hash_name=None, hash_size=None):
+    """Return (PathTable, hashes) where hashes[file id] is the hex hash or None.
 
-def main():
-    # Gather all images
-    valid_exts = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.webp', '.heic'}
-    image_paths = [
-        os.path.join(dp, f)
-        for dp, _, files in os.walk(IMAGE_DIR)
-        for f in files
-        if os.path.splitext(f.lower())[1] in valid_exts
-    ]
+    With hash_name and hash_size, refuse (HashMismatch) a cache built with other settings.
+    """
+    table, hashes, _, _, _ = _load_cache(cache_file, hash_name, hash_size)
+    return table, hashes
+
+
+
+def save_cached_hashes(table, hashes, cache_file=HASH_CACHE_FILE, archives=None, times=None,
+                       hash_name=None, hash_size=None):
+    hashed = [i for i, h in enumerate(hashes) if h]
+    cache = {"version": CACHE_VERSION}
+    if hash_name is not None:
+        cache.update({"hash": hash_name, "hash_size": hash_size})
+    cache.update(table.to_json(hashed))
+    cache["hashes"] = [hashes[i] for i in hashed]
+    if archives:
+        cache["archives"] = archives
+    if times and any(t is not None for t in times):
+        # EXIF capture times read while hashing: seconds, 0 = none in the file, None = not read yet
+        cache["times"] = [times[i] if i < len(times) else None for i in hashed]
+    # Write a temp file and swap it in, so readers (e.g. the lookup server) never see half a cache
+    tmp = cache_file + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(cache, f, separators=(",", ":"))
+    os.replace(tmp, cache_file)
+
+
+def _forget_archives(table, hashes, archive_paths):
+    """Drop cached member hashes of archives that changed since they were hashed."""
+    archive_paths = set(archive_paths)
+    stale_dirs = set()
+    for dir_id, dir_path in enumerate(table.dir_paths):
+        archive_path, member = split_member(dir_path)
+        if member is not None and archive_path in archive_paths:
+            stale_dirs.add(dir_id)
+    if stale_dirs:
+        for file_id in range(len(hashes)):
+            if table.file_dir[file_id] in stale_dirs:
+                hashes[file_id] = None
+
+
+def scan(image_dir=IMAGE_DIR, cache_file=HASH_CACHE_FILE, processes=N_PROCESSES,
+         hash_name=HASH_NAME, hash_size=HASH_SIZE, readers=N_READERS, archives=SCAN_ARCHIVES,
+         thumbs_dir=THUMBS_DIR):
+    """Hash every image under image_dir that is not already in the cache.
+
+    With archives, images inside new or changed .zip/.tar files are hashed too.
+    The EXIF capture time and a verification thumbnail (into thumbs_dir)
+    come from the same decoded image, so later passes never reopen it.
+    Returns (PathTable, hashes) covering the cache plus everything found.
+    """
+    from collections import deque
+    from tqdm import tqdm
+    from verify import append_thumbs
 
-    print(f"Found {len(image_paths)} image files. Checking for cached hashes...")
-    #print(f"Found {len(image_paths)} images. Computing hashes using {N_PROCESSES} cores...")
+    def record(results):
+        """Store hashes and times as results arrive, passing the thumbnails on."""
+        for path, h, t, thumb in results:
+            file_id = table.add(path)
+            hashes.extend([None] * (len(table) - len(hashes)))
+            times.extend([None] * (len(table) - len(times)))
+            hashes[file_id], times[file_id] = h, t
+            yield path, thumb if h else None
 
-    # Step 2. Load previously cached hashes
-    cached_hashes = load_cached_hashes()
+    def consume(results):
+        if thumbs_dir:
+            append_thumbs(record(results), thumbs_dir)
+        else:
+            deque(record(results), maxlen=0)
+
+    # Step 1. Load previously cached hashes (made with the same hash settings)
+    table, hashes, stamps, times, _ = _load_cache(cache_file, hash_name, hash_size)
+
+    # Step 2. Gather all images (and archives) into the path table
+    found_ids = table.walk(image_dir, VALID_EXTS | ARCHIVE_WALK_EXTS if archives else VALID_EXTS)
+    archive_paths = [table.path(i) for i in found_ids if is_archive(table.file_name[i])]
+    # The walk matches on the last suffix only, so e.g. a plain .gz shows up too
+    image_ids = [i for i in found_ids if os.path.splitext(table.file_name[i].lower())[1] in VALID_EXTS]
+    hashes.extend([None] * (len(table) - len(hashes)))
+    times.extend([None] * (len(table) - len(times)))
+    print(f"Found {len(image_ids)} image files. Checking for cached hashes...")
 
     # Only process new/unseen images
-    new_images = [p for p in image_paths if p not in cached_hashes]
-    print(f"{len(new_images)} new images to hash, using {N_PROCESSES} cores...")
+    new_images = [table.path(i) for i in image_ids if hashes[i] is None]
+    print(f"{len(new_images)} new images to hash, using {processes} cores...")
+
+    # Only reopen archives whose mtime or size changed
+    changed = {}
+    for path in archive_paths:
+        stamp = archive_stamp(path)
+        if stamps.get(path, [])[:2] != stamp:
+            changed[path] = stamp
+    if archive_paths:
+        print(f"Found {len(archive_paths)} archives, {len(changed)} new or changed.")
 
     # Step 3. Compute hashes in parallel for new images
     if new_images:
-        with Pool(processes=N_PROCESSES) as pool:
-            new_results = list(tqdm(pool.imap_unordered(compute_hash, new_images), total=len(new_images)))
-        for path, h in new_results:
-            if h:
-                cached_hashes[path] = h
+        if readers:
+            # Dedicated read-ahead stage hands file bytes to the workers via shared memory
+            from readahead import hash_files
+            consume(tqdm(hash_files(new_images, processes, readers, hash_name, hash_size), total=len(new_images)))
+        else:
+            worker = partial(hash_with_time, hash_name=hash_name, hash_size=hash_size)
+            chunksize = max(1, min(64, len(new_images) // (processes * 4)))
+            with Pool(processes=processes) as pool:
+                consume(tqdm(pool.imap_unordered(worker, new_images, chunksize=chunksize), total=len(new_images)))
 
+    # Step 4. Stream members of new/changed archives to the workers
+    if changed:
+        from archives import hash_archives
+
+        _forget_archives(table, hashes, changed)
+        consume(tqdm(hash_archives(list(changed), processes, hash_name, hash_size), unit="member"))
+        # Member sizes were recorded while streaming; keep them for the report and the reviewer
+        for path, stamp in changed.items():
+            stamps[path] = stamp + [known_sizes(path)]
+
+    if new_images or changed:
         # Save updated cache
-        save_cached_hashes(cached_hashes)
+        save_cached_hashes(table, hashes, cache_file, stamps, times, hash_name, hash_size)
 
-    # Parallel hash computation
-    #with Pool(processes=N_PROCESSES) as pool:
-        #results = list(tqdm(pool.imap_unordered(compute_hash, image_paths), total=len(image_paths)))
+    return table, hashes
 
-    # Group by hash
-    hash_dict = defaultdict(list)
-    for path, h in cached_hashes.items():
-        if h:
-            hash_dict[h].append(path)
 
-    # Detect exact duplicates
-    duplicates = {h: paths for h, paths in hash_dict.items() if len(paths) > 1}
+def collect_times(cache_file=HASH_CACHE_FILE, processes=N_PROCESSES):
+    """Read the EXIF capture time of every cached image that has none yet.
 
+    scan records the time while hashing, so this only reopens images hashed
+    before times were cached. Returns (PathTable, hashes, times) with
+    times[file id] in seconds, 0 when the file has no capture time.
     """
-    # --- Output results ---
-    print("\nDuplicate groups found:")
-    for h, paths in duplicates.items():
-        print(f"\nHash: {h}")
-        for p in paths:
-            print("   ", p)
+    from tqdm import tqdm
+    from hashing import capture_time
 
-    print(f"\nTotal duplicate groups: {len(duplicates)}")
+    table, hashes, stamps, times, algorithm = _load_cache(cache_file)
+    times.extend([None] * (len(hashes) - len(times)))
+    todo = []
+    for i, h in enumerate(hashes):
+        if h and times[i] is None:
+            if split_member(table.path(i))[1] is not None:
+                times[i] = 0          # not worth reopening the archive per member
+            else:
+                todo.append(table.path(i))
+    print(f"Reading capture times of {len(todo)} images...")
+    if todo:
+        with Pool(processes=processes) as pool:
+            for path, t in tqdm(pool.imap_unordered(capture_time, todo, chunksize=64), total=len(todo)):
+                times[table.find(path)] = t
+        save_cached_hashes(table, hashes, cache_file, stamps, times, *(algorithm or ()))
+    return table, hashes, times
+
+
+def group(hashes, tolerance=HAMMING_TOLERANCE):
+    """Group file ids by hash and keep only groups with more than one file.
+
+    With tolerance > 0, hashes within that Hamming distance of each other are
+    chained into one group, keyed by its first hash. These are candidates:
+    run verify.py on them to drop the false positives.
     """
+    hash_dict = defaultdict(list)
+    for file_id, h in enumerate(hashes):
+        if h:
+            hash_dict[h].append(file_id)
+
+    if tolerance:
+        from hamming_index import HammingIndex
 
-    # Step 6. Save duplicates report to CSV
+        index = HammingIndex(tolerance)
+        for h in hash_dict:
+            index.add(h, h)
+        parent = {}
+
+        def find(x):
+            parent.setdefault(x, x)
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for h in hash_dict:
+            for other, _ in index.query(h):
+                if other != h:
+                    parent[find(other)] = find(h)
+        merged = defaultdict(list)
+        for h in sorted(hash_dict):
+            merged[find(h)].append(h)
+        hash_dict = {hs[0]: [i for h in hs for i in hash_dict[h]] for hs in merged.values()}
+
+    # Detect exact (or near, with tolerance) duplicates
+    return {h: ids for h, ids in hash_dict.items() if len(ids) > 1}
+
+
+def save_duplicates(table, duplicates, duplicates_file=DUPLICATES_FILE):
+    # Save duplicates report to JSON
     if duplicates:
 
         #with open(DUPLICATES_CSV_FILE, "w", newline='', encoding="utf-8") as csvfile:
@@ -105,13 +265,33 @@ def main():
             #for h, paths in duplicates.items():
                 #for p in paths:
                     #writer.writerow([h, p])
-        with open(DUPLICATES_FILE, "w", encoding="utf-8") as f:
-            json.dump(duplicates, f, indent=2)
+        save_report(table, duplicates, duplicates_file)
 
-        print(f"\nDuplicate report saved to: {DUPLICATES_FILE}")
+        print(f"\nDuplicate report saved to: {duplicates_file}")
     else:
         print("\nNo duplicates found.")
 
 
+def main():
+    table, hashes = scan()
+    duplicates = group(hashes)
+    if VERIFY_GROUPS or HAMMING_TOLERANCE:
+        from verify import verify_duplicates
+        duplicates = verify_duplicates(table, duplicates, processes=N_PROCESSES)
+
+    """
+    # --- Output results ---
+    print("\nDuplicate groups found:")
+    for h, paths in duplicates.items():
+        print(f"\nHash: {h}")
+        for i in paths:
+            print("   ", table.path(i))
+
+    print(f"\nTotal duplicate groups: {len(duplicates)}")
+    """
+
+    save_duplicates(table, duplicates)
+
+
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,184 @@
+"""Hash images stored inside zip/tar archives without extracting them.
+
+Archive members are addressed as `<archive>!/<member>`, e.g.
+
+    E:/Backups/phone-2019.zip!/DCIM/Camera/IMG_0001.jpg
+
+and go into the hash cache and duplicates.json like any other path. Member
+bytes are streamed from the archive in the main process (one sequential
+read per archive) and hashed by the pool workers. The cache remembers each
+archive's [mtime, size, {member: size}], so unchanged archives are never
+reopened and member sizes are known without opening them.
+
+Readers that need several members (report stats, the reviewer) use
+read_members, which reads each archive once for the whole batch.
+
+Kept light like hashing.py: the pool workers import this module.
+"""
+import io
+import os
+import re
+import tarfile
+import zipfile
+import threading
+from functools import partial
+from multiprocessing import Pool
+
+from hashing import hash_with_time, VALID_EXTS, DEFAULT_HASH, DEFAULT_HASH_SIZE
+
+# Full suffixes; tarfile detects gzip/bz2/xz compression itself
+ARCHIVE_EXTS = ('.zip', '.tar', '.tgz', '.tbz2', '.txz', '.tar.gz', '.tar.bz2', '.tar.xz')
+# What os.path.splitext sees of those (".gz" for ".tar.gz"), for the directory walk
+ARCHIVE_WALK_EXTS = {"." + ext.rsplit(".", 1)[1] for ext in ARCHIVE_EXTS}
+MEMBERS_IN_FLIGHT = 8        # member buffers queued per worker process
+
+_MEMBER_RE = re.compile(r"^(.*?\.(?:zip|tar(?:\.gz|\.bz2|\.xz)?|tgz|tbz2|txz))!(?:[\\/](.*))?$",
+                        re.IGNORECASE)
+
+# Member sizes per archive ({archive path: {member name: size}}), filled while
+# scanning, from the hash cache, or by listing an archive once
+_member_sizes = {}
+
+
+def is_archive(path):
+    return path.lower().endswith(ARCHIVE_EXTS)
+
+
+def member_path(archive_path, name):
+    return f"{archive_path}!/{name}"
+
+
+def split_member(path):
+    """Return (archive path, member name) or (path, None) for a plain file.
+
+    Also accepts directories inside an archive ("x.zip!/DCIM", "x.zip!" -> "").
+    """
+    m = _MEMBER_RE.match(path)
+    if m is None:
+        return path, None
+    return m.group(1), (m.group(2) or "").replace("\\", "/")
+
+
+def archive_stamp(archive_path):
+    """[mtime, size] used to decide whether a cached archive must be re-read.
+
+    The cache stores [mtime, size, {member: size}]; compare stamp[:2].
+    """
+    st = os.stat(archive_path)
+    return [st.st_mtime, st.st_size]
+
+
+def iter_members(archive_path, exts=VALID_EXTS, wanted=None):
+    """Yield (member path, bytes) for every image member, in on-disk order.
+
+    With wanted (a set of member names) only those are read, and reading
+    stops as soon as all of them were found. A full pass records the
+    member sizes for member_size().
+    """
+    remaining = set(wanted) if wanted is not None else None
+    sizes = {}
+
+    def keep(name):
+        if remaining is not None:
+            return name in remaining
+        return os.path.splitext(name.lower())[1] in exts
+
+    try:
+        if zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path) as zf:
+                infos = [i for i in zf.infolist() if not i.is_dir()]
+                _member_sizes[archive_path] = {i.filename: i.file_size for i in infos}
+                for info in sorted(infos, key=lambda i: i.header_offset):
+                    if keep(info.filename):
+                        yield member_path(archive_path, info.filename), zf.read(info)
+                        if remaining is not None:
+                            remaining.discard(info.filename)
+                            if not remaining:
+                                return
+        else:
+            # Stream mode: one forward pass, also for compressed tars
+            with tarfile.open(archive_path, "r|*") as tf:
+                for info in tf:
+                    if not info.isfile():
+                        continue
+                    sizes[info.name] = info.size
+                    if keep(info.name):
+                        yield member_path(archive_path, info.name), tf.extractfile(info).read()
+                        if remaining is not None:
+                            remaining.discard(info.name)
+                            if not remaining:
+                                return
+            _member_sizes[archive_path] = sizes
+    except Exception as e:
+        # Truncated or corrupt archives raise EOFError, zlib.error, BadZipFile, TarError...
+        print(f"⚠ Could not read archive {archive_path}: {e}")
+
+
+def read_members(paths):
+    """Yield (member path, bytes) for the given member paths, reading each archive once."""
+    by_archive = {}
+    for path in paths:
+        archive_path, name = split_member(path)
+        by_archive.setdefault(archive_path, set()).add(name)
+    for archive_path, names in by_archive.items():
+        yield from iter_members(archive_path, wanted=names)
+
+
+def open_member(path):
+    """Return a seekable file object with the bytes of one archive member."""
+    for _, data in read_members([path]):
+        return io.BytesIO(data)
+    raise KeyError(f"{path} not found")
+
+
+def member_sizes(archive_path):
+    """{member name: size} of an archive, listing it once (headers only for zip) if not known yet."""
+    sizes = _member_sizes.get(archive_path)
+    if sizes is None:
+        if zipfile.is_zipfile(archive_path):
+            with zipfile.ZipFile(archive_path) as zf:
+                sizes = {i.filename: i.file_size for i in zf.infolist() if not i.is_dir()}
+        else:
+            with tarfile.open(archive_path, "r|*") as tf:
+                sizes = {i.name: i.size for i in tf if i.isfile()}
+        _member_sizes[archive_path] = sizes
+    return sizes
+
+
+def known_sizes(archive_path):
+    """Member sizes recorded so far for an archive ({} if none), without opening it."""
+    return _member_sizes.get(archive_path, {})
+
+
+def remember_sizes(archive_path, sizes):
+    """Register member sizes known from the hash cache."""
+    _member_sizes[archive_path] = dict(sizes)
+
+
+def member_size(path):
+    """Uncompressed size of an archive member."""
+    archive_path, name = split_member(path)
+    return member_sizes(archive_path)[name]
+
+
+def hash_member(item, hash_name=DEFAULT_HASH, hash_size=DEFAULT_HASH_SIZE):
+    path, data = item
+    return hash_with_time(path, hash_name, hash_size, source=io.BytesIO(data))
+
+
+def hash_archives(archive_paths, processes=4, hash_name=DEFAULT_HASH, hash_size=DEFAULT_HASH_SIZE):
+    """Yield hash_with_time results (path, hash, time, thumbnail) for every image inside archive_paths."""
+    # Pool.imap_unordered drains its input as fast as it can; bound the member bytes in flight
+    slots = threading.BoundedSemaphore(processes * MEMBERS_IN_FLIGHT)
+
+    def feed():
+        for archive_path in archive_paths:
+            for item in iter_members(archive_path):
+                slots.acquire()
+                yield item
+
+    worker = partial(hash_member, hash_name=hash_name, hash_size=hash_size)
+    with Pool(processes=processes) as pool:
+        for result in pool.imap_unordered(worker, feed(), chunksize=1):
+            slots.release()
+            yield result
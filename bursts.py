@@ -0,0 +1,79 @@
+"""Group burst shots: similar images taken within a few seconds of each other.
+
+Burst frames differ slightly, so they fail the exact-hash match, and
+comparing every pair of hashes in the library is quadratic. Here images are
+sorted by EXIF capture time and each one is only compared with the images
+taken in the BURST_WINDOW_S seconds before it, so the work is
+(number of images) x (images per window).
+
+Bursts go to their own report (bursts.json) so they can be reviewed apart
+from exact duplicates. Copies of one photo share its capture time and hash,
+so each hash takes part once (its earliest file) and only near-but-not-equal
+frames are linked; the copies themselves are left to duplicates.json:
+
+    python imagesearch.py bursts
+    python imagesearch.py review --report bursts.json
+"""
+from collections import deque
+
+# --- CONFIGURATION ---
+BURSTS_FILE = "bursts.json"
+BURST_WINDOW_S = 3.0         # max seconds between two frames of the same burst
+BURST_MAX_DISTANCE = 0.2     # max Hamming distance, as a fraction of the hash bits
+MAX_WINDOW = 64              # frames compared per image (guards against bad clocks stamping many files alike)
+
+
+def burst_groups(hashes, times, window_s=BURST_WINDOW_S, max_distance=BURST_MAX_DISTANCE):
+    """Return {"burst-N": [file ids]} for images linked by time and hash similarity."""
+    timed = sorted((times[i], i) for i, h in enumerate(hashes) if h and i < len(times) and times[i])
+    if not timed:
+        return {}
+    n_bits = len(hashes[timed[0][1]]) * 4
+    limit = int(max_distance * n_bits)
+
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    # Sliding window of (time, file id, hash as int) for the frames just before this one
+    recent = deque()
+    seen = set()
+    for t, i in timed:
+        if hashes[i] in seen:
+            continue          # an exact copy of an earlier frame: that's a duplicate, not a burst
+        seen.add(hashes[i])
+        while recent and t - recent[0][0] > window_s:
+            recent.popleft()
+        h = int(hashes[i], 16)
+        for _, j, other in recent:
+            if (h ^ other).bit_count() <= limit:
+                parent[find(i)] = find(j)
+        recent.append((t, i, h))
+        if len(recent) > MAX_WINDOW:
+            recent.popleft()
+
+    groups = {}
+    for x in parent:
+        groups.setdefault(find(x), []).append(x)
+    ordered = sorted((sorted(g, key=lambda i: times[i]) for g in groups.values() if len(g) > 1),
+                     key=lambda g: times[g[0]])
+    return {f"burst-{n}": g for n, g in enumerate(ordered, 1)}
+
+
+def find_bursts(cache_file="image_hashes.json", report_file=BURSTS_FILE, processes=4,
+                window_s=BURST_WINDOW_S, max_distance=BURST_MAX_DISTANCE):
+    """Fill in missing capture times, group bursts and write them as a report."""
+    from Mark3 import collect_times
+    from report import save_report
+
+    table, hashes, times = collect_times(cache_file, processes)
+    groups = burst_groups(hashes, times, window_s, max_distance)
+    save_report(table, groups, report_file)
+    n_frames = sum(len(g) for g in groups.values())
+    print(f"{len(groups)} bursts ({n_frames} frames) saved to: {report_file}")
+    return groups
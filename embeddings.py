@@ -0,0 +1,243 @@
+"""CPU embedding extractor with an int8 ONNX Runtime backend.
+
+main_1.py builds DeepImageSearch's Search_Setup, which runs the timm model in
+full-precision PyTorch one image at a time. Here the same timm model is
+exported once to ONNX, quantized to int8 (static, calibrated on a sample of
+the library) and run with ONNX Runtime on batches fed by a multi-threaded
+loader. Decoding uses PIL's draft mode so JPEGs are decoded at reduced size,
+and the decoded 224 px crops are shared by both backends when benchmarking.
+
+    python imagesearch.py embed E:/Pictures --model vgg19
+    python imagesearch.py embed E:/Pictures --benchmark 500
+"""
+import os
+import json
+import time
+import itertools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+from PIL import Image
+
+# --- CONFIGURATION ---
+MODEL_NAME = "vgg19"
+MODEL_DIR = "models"
+EMBEDDINGS_FILE = "embeddings.npy"
+EMBEDDING_PATHS_FILE = "embedding_paths.json"
+INPUT_SIZE = 224
+BATCH_SIZE = 32
+N_LOADERS = 8               # preprocessing threads (PIL releases the GIL while decoding)
+N_CALIBRATION = 200         # images used to calibrate int8 activations
+MEAN = np.array([0.485, 0.456, 0.406], dtype=np.float32)
+STD = np.array([0.229, 0.224, 0.225], dtype=np.float32)
+
+
+# --- PREPROCESSING ---
+def load_image(path, size=INPUT_SIZE):
+    """Decode at reduced size, resize the short side and centre-crop to size x size (uint8)."""
+    try:
+        with Image.open(path) as img:
+            img.draft("RGB", (size * 2, size * 2))
+            img = img.convert("RGB")
+            scale = size / min(img.size)
+            img = img.resize((max(size, round(img.width * scale)), max(size, round(img.height * scale))),
+                             Image.BILINEAR)
+            left, top = (img.width - size) // 2, (img.height - size) // 2
+            return np.asarray(img.crop((left, top, left + size, top + size)))
+    except Exception:
+        return None
+
+
+def to_tensor(batch):
+    """uint8 NHWC -> normalised float32 NCHW."""
+    x = batch.astype(np.float32) / 255.0
+    x = (x - MEAN) / STD
+    return np.ascontiguousarray(x.transpose(0, 3, 1, 2))
+
+
+def iter_batches(paths, batch_size=BATCH_SIZE, n_loaders=N_LOADERS):
+    """Yield (paths, uint8 batch) while the next images are decoded in background threads."""
+    # pool.map would submit every path at once; keep at most a window of decodes in flight
+    window = max(1, n_loaders * batch_size)
+    paths = iter(paths)
+    with ThreadPoolExecutor(max_workers=n_loaders) as pool:
+        pending = deque((p, pool.submit(load_image, p)) for p in itertools.islice(paths, window))
+        batch_paths, batch = [], []
+        while pending:
+            path, future = pending.popleft()
+            for p in itertools.islice(paths, 1):
+                pending.append((p, pool.submit(load_image, p)))
+            img = future.result()
+            if img is None:
+                continue
+            batch_paths.append(path)
+            batch.append(img)
+            if len(batch) == batch_size:
+                yield batch_paths, np.stack(batch)
+                batch_paths, batch = [], []
+        if batch:
+            yield batch_paths, np.stack(batch)
+
+
+# --- BACKENDS ---
+class TorchBackend:
+    """Reference full-precision PyTorch path (same model DeepImageSearch loads)."""
+    def __init__(self, model_name=MODEL_NAME):
+        import timm
+        import torch
+
+        self.torch = torch
+        self.model = timm.create_model(model_name, pretrained=True, num_classes=0).eval()
+
+    def __call__(self, batch):
+        with self.torch.inference_mode():
+            return self.model(self.torch.from_numpy(to_tensor(batch))).numpy()
+
+
+class OnnxBackend:
+    """ONNX Runtime session over the exported (optionally int8) model."""
+    def __init__(self, onnx_path, threads=None):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = ort.InferenceSession(onnx_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        return self.session.run(None, {self.input_name: to_tensor(batch)})[0]
+
+
+def export_onnx(model_name=MODEL_NAME, model_dir=MODEL_DIR):
+    """Export the timm feature extractor to ONNX once; returns the .onnx path."""
+    onnx_path = os.path.join(model_dir, f"{model_name}.onnx")
+    if os.path.exists(onnx_path):
+        return onnx_path
+    import timm
+    import torch
+
+    os.makedirs(model_dir, exist_ok=True)
+    model = timm.create_model(model_name, pretrained=True, num_classes=0).eval()
+    dummy = torch.zeros(1, 3, INPUT_SIZE, INPUT_SIZE)
+    torch.onnx.export(model, dummy, onnx_path, input_names=["input"], output_names=["embedding"],
+                      dynamic_axes={"input": {0: "batch"}, "embedding": {0: "batch"}}, opset_version=17)
+    print(f"Exported {model_name} to {onnx_path}")
+    return onnx_path
+
+
+def quantize_onnx(onnx_path, calibration_paths):
+    """Write an int8 copy of the model next to onnx_path; returns its path.
+
+    Static quantization calibrated on real images when some are given
+    (best for conv nets), dynamic weight-only quantization otherwise.
+    """
+    int8_path = onnx_path.replace(".onnx", ".int8.onnx")
+    if os.path.exists(int8_path):
+        return int8_path
+    from onnxruntime.quantization import (
+        CalibrationDataReader, QuantFormat, QuantType, quantize_dynamic, quantize_static)
+    from onnxruntime.quantization.shape_inference import quant_pre_process
+
+    prepared = onnx_path.replace(".onnx", ".prep.onnx")
+    quant_pre_process(onnx_path, prepared)
+
+    if not calibration_paths:
+        quantize_dynamic(prepared, int8_path, weight_type=QuantType.QInt8)
+        return int8_path
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self.batches = (({"input": to_tensor(b)}) for _, b in iter_batches(calibration_paths, 8))
+
+        def get_next(self):
+            return next(self.batches, None)
+
+    quantize_static(prepared, int8_path, Reader(), quant_format=QuantFormat.QDQ,
+                    activation_type=QuantType.QUInt8, weight_type=QuantType.QInt8, per_channel=True)
+    print(f"Quantized model saved to {int8_path}")
+    return int8_path
+
+
+def get_backend(backend="onnx-int8", model_name=MODEL_NAME, calibration_paths=(), model_dir=MODEL_DIR):
+    if backend == "torch":
+        return TorchBackend(model_name)
+    onnx_path = export_onnx(model_name, model_dir)
+    if backend == "onnx-int8":
+        onnx_path = quantize_onnx(onnx_path, list(calibration_paths)[:N_CALIBRATION])
+    return OnnxBackend(onnx_path)
+
+
+# --- INDEXING ---
+def embed(paths, model, batch_size=BATCH_SIZE):
+    """Return (kept paths, L2-normalised float32 embeddings)."""
+    from tqdm import tqdm
+
+    kept, vectors = [], []
+    with tqdm(total=len(paths)) as bar:
+        for batch_paths, batch in iter_batches(paths, batch_size):
+            vectors.append(model(batch).reshape(len(batch), -1))
+            kept.extend(batch_paths)
+            bar.update(len(batch))
+    if not vectors:
+        return kept, np.zeros((0, 0), dtype=np.float32)
+    emb = np.concatenate(vectors).astype(np.float32)
+    emb /= np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12
+    return kept, emb
+
+
+def save_embeddings(paths, emb, embeddings_file=EMBEDDINGS_FILE, paths_file=EMBEDDING_PATHS_FILE):
+    np.save(embeddings_file, emb)
+    with open(paths_file, "w", encoding="utf-8") as f:
+        json.dump(paths, f)
+    print(f"Saved {len(paths)} embeddings to {embeddings_file}")
+
+
+def nearest(emb, k=10):
+    """Top-k neighbours (by cosine) of every row, excluding itself."""
+    result = np.empty((len(emb), k), dtype=np.int64)
+    for start in range(0, len(emb), 1024):
+        sims = emb[start:start + 1024] @ emb.T
+        rows = np.arange(sims.shape[0])
+        sims[rows, start + rows] = -np.inf
+        top = np.argpartition(-sims, k, axis=1)[:, :k]
+        order = np.argsort(-np.take_along_axis(sims, top, axis=1), axis=1)
+        result[start:start + 1024] = np.take_along_axis(top, order, axis=1)
+    return result
+
+
+def benchmark(paths, model_name=MODEL_NAME, n_images=500, k=10, model_dir=MODEL_DIR):
+    """Compare throughput and retrieval quality of the PyTorch and int8 ONNX paths.
+
+    Images are decoded once and the same batches are fed to every backend, so
+    the numbers measure inference only; decode throughput is reported apart.
+    """
+    paths = paths[:n_images]
+    start = time.perf_counter()
+    batches = list(iter_batches(paths))
+    decode_time = time.perf_counter() - start
+    n = sum(len(p) for p, _ in batches)
+    print(f"Decoded {n} images in {decode_time:.1f}s ({n / decode_time:.0f} img/s, {N_LOADERS} threads)")
+
+    results = {}
+    for name in ("torch", "onnx-fp32", "onnx-int8"):
+        model = get_backend(name, model_name, paths, model_dir)
+        model(batches[0][1][:1])   # warm-up
+        start = time.perf_counter()
+        emb = np.concatenate([model(b).reshape(len(b), -1) for _, b in batches]).astype(np.float32)
+        elapsed = time.perf_counter() - start
+        emb /= np.linalg.norm(emb, axis=1, keepdims=True) + 1e-12
+        results[name] = emb
+        print(f"{name:>10}: {n / elapsed:7.1f} img/s")
+
+    reference = results["torch"]
+    ref_nn = nearest(reference, min(k, n - 1))
+    for name in ("onnx-fp32", "onnx-int8"):
+        emb = results[name]
+        cosine = float(np.mean(np.sum(emb * reference, axis=1)))
+        nn = nearest(emb, min(k, n - 1))
+        recall = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(nn, ref_nn)])
+        print(f"{name:>10}: mean cosine to torch {cosine:.4f}, top-{k} neighbour overlap {recall:.3f}")
+    return results
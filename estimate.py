@@ -0,0 +1,185 @@
+"""Estimate the duplicate rate of a folder from a random sample, before a full scan.
+
+Only the file list is built for the whole folder; a uniform random sample of
+it is hashed (images already in the hash cache are not hashed again) and
+the result is extrapolated from the sample's multiplicity profile
+(f[j] = number of hashes seen exactly j times in the sample):
+
+* a hash with k copies in the folder shows up j times in a sample of
+  fraction q with binomial probability C(k, j) q^j (1-q)^(k-j),
+* the number of hashes with k copies, F[k], is recovered from the observed
+  f[j >= 2] by EM (Poisson deconvolution, started from the profile itself),
+* the duplicate files are sum((k - 1) F[k]), i.e. the folder's files minus
+  its distinct hashes, and reclaimable bytes use the size of the extra
+  copies seen in the sample,
+* 95% intervals come from a Poisson bootstrap over the sampled groups.
+
+With a small sample of a huge folder, big groups are mostly seen as pairs
+and the estimate leans high; the interval narrows as the sample grows.
+
+    python imagesearch.py estimate //nas3/photos --sample 20000
+"""
+import os
+import random
+from math import lgamma
+from functools import partial
+from multiprocessing import Pool
+
+import numpy as np
+
+from hashing import compute_hash, iter_images, DEFAULT_HASH, DEFAULT_HASH_SIZE
+
+# --- CONFIGURATION ---
+SAMPLE_SIZE = 20000
+N_BOOTSTRAP = 1000
+CONFIDENCE = 0.95
+SEED = 1234
+MAX_GROUP = 1000          # largest group size assumed beyond what the sample shows
+DECONVOLVE_MAX = 50       # hashes sampled more often than this are scaled up directly (j / q copies)
+EM_ITERATIONS = 3000
+EM_TOLERANCE = 1e-7       # stop once the estimated duplicates change by less than this fraction
+
+
+def _sample_groups(sample_hashes, sizes):
+    """Group sampled files by hash: [(member indices, member sizes)] for groups of 2+."""
+    by_hash = {}
+    for n, h in enumerate(sample_hashes):
+        if h:
+            by_hash.setdefault(h, []).append(n)
+    return [(members, [sizes[m] for m in members]) for members in by_hash.values() if len(members) > 1]
+
+
+def _thinning(k_max, j_max, q):
+    """P[k-2, j-2] = probability that a hash with k copies is sampled j times (k, j >= 2)."""
+    k = np.arange(2, k_max + 1)[:, None]
+    j = np.arange(2, j_max + 1)[None, :]
+    if q >= 1:
+        return (k == j).astype(float)
+    log_fact = np.array([lgamma(i + 1) for i in range(k_max + 1)])
+    log_p = log_fact[k] - log_fact[j] - log_fact[np.maximum(k - j, 0)] + j * np.log(q) + (k - j) * np.log1p(-q)
+    return np.where(j <= k, np.exp(log_p), 0.0)
+
+
+def _copy_counts(profile, q, start=None):
+    """EM estimate of F[k-2] = hashes with k copies in the whole folder, from profile f[j] (j >= 2).
+
+    Returns (F, k); start warm-starts the iterations (used by the bootstrap).
+    """
+    j_max = len(profile) - 1
+    # Never below the largest group actually sampled, however big it is
+    k_max = max(j_max, int(min(MAX_GROUP, 2 * j_max / q)))
+    P = _thinning(k_max, j_max, q)
+    k = np.arange(2, k_max + 1)
+    # Probability of being seen at least twice: hashes seen more than j_max times count as f[j] = 0
+    seen = 1 - (1 - q) ** k - k * q * (1 - q) ** (k - 1) if q < 1 else np.ones(len(k))
+    observed = np.asarray(profile[2:], dtype=float)
+    if start is None:
+        # Start as if every hash had exactly as many copies as were sampled
+        F = np.full(len(k), 1e-3)
+        F[:j_max - 1] += observed / seen[:j_max - 1]
+    else:
+        F = start.copy()
+    duplicates = None
+    for _ in range(EM_ITERATIONS):
+        F *= (P @ (observed / np.maximum(F @ P, 1e-300))) / seen
+        previous, duplicates = duplicates, ((k - 1) * F).sum()
+        if previous is not None and abs(duplicates - previous) <= EM_TOLERANCE * duplicates:
+            break
+    return F, k
+
+
+def _extrapolate(groups, n, n_total, weights=None, start=None):
+    """(duplicate files, reclaimable bytes, F) for the whole folder.
+
+    weights are bootstrap counts per sampled group (None = the sample itself).
+    """
+    if n < 2 or not groups:
+        return 0.0, 0.0, None
+    q = n / n_total
+    w = np.ones(len(groups)) if weights is None else weights
+    # The profile's length depends only on the groups, so bootstrap runs can warm-start from F
+    profile = np.zeros(min(max(len(members) for members, _ in groups), DECONVOLVE_MAX) + 1)
+    files = extra_files = extra_bytes = 0.0
+    for wg, (members, sizes) in zip(w, groups):
+        if len(members) > DECONVOLVE_MAX:
+            # Seen this often the sampled count pins the group size down (blank frames, icons...)
+            files += wg * (len(members) / q - 1)
+        else:
+            profile[len(members)] += wg
+        extra_files += wg * (len(members) - 1)
+        extra_bytes += wg * (sum(sizes) - max(sizes))
+    if not extra_files:
+        return 0.0, 0.0, start
+    F = start
+    if profile[2:].any():
+        F, k = _copy_counts(profile, q, start)
+        files += ((k - 1) * F).sum()
+    # Extra copies in the folder are as big, on average, as the extra copies in the sample
+    return files, files * extra_bytes / extra_files, F
+
+
+def estimate(image_dir, sample_size=SAMPLE_SIZE, cache_file="image_hashes.json", processes=4,
+             hash_name=DEFAULT_HASH, hash_size=DEFAULT_HASH_SIZE, seed=SEED):
+    """Hash a random sample of image_dir and print the estimated duplicates with 95% intervals."""
+    from tqdm import tqdm
+    from Mark3 import load_cached_hashes
+
+    # Step 1. List the folder (names only) and draw the sample
+    paths = list(iter_images(image_dir))
+    n_total = len(paths)
+    rng = random.Random(seed)
+    sample = rng.sample(paths, min(sample_size, n_total))
+    n = len(sample)
+    print(f"Found {n_total} image files, sampling {n}.")
+
+    # Step 2. Hash the sample, taking what the cache already has
+    table, hashes = load_cached_hashes(cache_file, hash_name, hash_size)
+    sample_hashes = []
+    todo = []
+    for path in sample:
+        file_id = table.find(path)
+        h = hashes[file_id] if file_id is not None and file_id < len(hashes) else None
+        sample_hashes.append(h)
+        if h is None:
+            todo.append(path)
+    print(f"{n - len(todo)} sampled images found in the cache, hashing {len(todo)}...")
+    if todo:
+        worker = partial(compute_hash, hash_name=hash_name, hash_size=hash_size)
+        index = {path: i for i, path in enumerate(sample)}
+        with Pool(processes=processes) as pool:
+            for path, h in tqdm(pool.imap_unordered(worker, todo, chunksize=16), total=len(todo)):
+                sample_hashes[index[path]] = h
+    sizes = []
+    for path in sample:
+        try:
+            sizes.append(os.path.getsize(path))
+        except OSError:
+            sizes.append(0)
+
+    # Step 3. Extrapolate, with a Poisson bootstrap over the sampled groups for the intervals
+    groups = _sample_groups(sample_hashes, sizes)
+    files, size, F = _extrapolate(groups, n, n_total)
+    np_rng = np.random.default_rng(seed)
+    boot = []
+    for _ in range(N_BOOTSTRAP):
+        boot.append(_extrapolate(groups, n, n_total, np_rng.poisson(1.0, len(groups)), F)[:2])
+    boot = np.array(boot).reshape(-1, 2)
+    tail = (1 - CONFIDENCE) / 2 * 100
+    lo, hi = np.percentile(boot, [tail, 100 - tail], axis=0) if groups else (np.zeros(2), np.zeros(2))
+    if not groups and n > 1:
+        # No duplicates in the sample: "rule of three" upper bound (on pairs, so also on files)
+        hi = np.array([3, 3 * np.mean(sizes)]) * n_total * (n_total - 1) / (n * (n - 1))
+
+    result = {
+        "files": n_total, "sample": n, "sample_duplicate_groups": len(groups),
+        "duplicate_files": [files, lo[0], hi[0]],
+        "duplicate_rate": [files / max(n_total, 1), lo[0] / max(n_total, 1), hi[0] / max(n_total, 1)],
+        "reclaimable_bytes": [size, lo[1], hi[1]],
+    }
+    gb = 1024 ** 3
+    pct = CONFIDENCE * 100
+    print(f"\nEstimated duplicate files: {files:,.0f}  ({pct:.0f}% interval {lo[0]:,.0f} - {hi[0]:,.0f})")
+    print(f"Estimated duplicate rate:  {result['duplicate_rate'][0]:.1%}  "
+          f"({result['duplicate_rate'][1]:.1%} - {result['duplicate_rate'][2]:.1%})")
+    print(f"Estimated reclaimable:     {size / gb:,.1f} GB  ({lo[1] / gb:,.1f} - {hi[1] / gb:,.1f} GB)")
+    return result
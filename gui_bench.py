@@ -0,0 +1,257 @@
+"""Headless performance harness for the reviewer windows.
+
+Builds a duplicates.json fixture (groups of 2 to 500 images with mixed
+resolutions), opens a reviewer's MainWindow under Qt's offscreen platform and
+switches through every group, recording:
+
+* group-switch latency: load_group() plus the event processing it triggers,
+* clear_group() time (by the size of the group being cleared) and the time
+  spent in each ImagePanel.update_display(),
+* event-loop stalls: gaps between HEARTBEAT_MS timer ticks longer than STALL_MS,
+* resident memory after each group and the peak for the run.
+
+    python imagesearch.py bench-gui                          # ImageReviewerMk3, default sizes
+    python imagesearch.py bench-gui --output base.json
+    python imagesearch.py bench-gui --baseline base.json     # exit 1 on a regression
+
+Fixture members are hard links to a few generated images, so the fixture is
+cheap to build and costs almost no disk space.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import importlib
+from statistics import median
+
+# --- CONFIGURATION ---
+FIXTURE_DIR = "gui_bench_fixture"
+GROUP_SIZES = (2, 10, 50, 200, 500)
+RESOLUTIONS = ((640, 480), (1920, 1080), (4000, 3000))
+HEARTBEAT_MS = 5
+STALL_MS = 50              # a heartbeat gap longer than this counts as a stall
+REGRESSION = 1.25          # with a baseline, fail when a metric grows by more than 25%
+
+
+def make_fixture(fixture_dir=FIXTURE_DIR, group_sizes=GROUP_SIZES, resolutions=RESOLUTIONS):
+    """Write fixture images and <fixture_dir>/duplicates.json; returns the report path."""
+    from PIL import Image, ImageFilter
+    from report import save_path_groups
+
+    report_file = os.path.join(fixture_dir, "duplicates.json")
+    manifest = {"sizes": list(group_sizes), "resolutions": [list(r) for r in resolutions]}
+    manifest_file = os.path.join(fixture_dir, "fixture.json")
+    if os.path.exists(report_file) and os.path.exists(manifest_file):
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            if json.load(f) == manifest:
+                return report_file
+    shutil.rmtree(fixture_dir, ignore_errors=True)
+    os.makedirs(os.path.join(fixture_dir, "images"))
+
+    sources = []
+    for w, h in resolutions:
+        path = os.path.join(fixture_dir, f"source_{w}x{h}.jpg")
+        noise = Image.effect_noise((w // 8, h // 8), 64).filter(ImageFilter.GaussianBlur(2))
+        Image.merge("RGB", [noise, noise.rotate(180), noise.transpose(Image.FLIP_LEFT_RIGHT)]) \
+            .resize((w, h), Image.BILINEAR).save(path, quality=90)
+        sources.append(path)
+
+    groups = {}
+    for g, size in enumerate(group_sizes):
+        members = []
+        for k in range(size):
+            path = os.path.join(fixture_dir, "images", f"group{g:02d}_{k:04d}.jpg")
+            try:
+                os.link(sources[k % len(sources)], path)
+            except OSError:
+                shutil.copyfile(sources[k % len(sources)], path)
+            members.append(os.path.abspath(path))
+        groups[f"group-{size}"] = members
+    save_path_groups(groups, report_file)
+    with open(manifest_file, "w", encoding="utf-8") as f:
+        json.dump(manifest, f)
+    return report_file
+
+
+def _memory_mb():
+    """(current, peak) resident memory of this process in MB."""
+    if sys.platform == "win32":
+        import ctypes
+        from ctypes import wintypes
+
+        class Counters(ctypes.Structure):
+            _fields_ = [("cb", wintypes.DWORD), ("PageFaultCount", wintypes.DWORD),
+                        ("PeakWorkingSetSize", ctypes.c_size_t), ("WorkingSetSize", ctypes.c_size_t),
+                        ("QuotaPeakPagedPoolUsage", ctypes.c_size_t), ("QuotaPagedPoolUsage", ctypes.c_size_t),
+                        ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t), ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+                        ("PagefileUsage", ctypes.c_size_t), ("PeakPagefileUsage", ctypes.c_size_t)]
+
+        counters = Counters()
+        counters.cb = ctypes.sizeof(counters)
+        ctypes.windll.psapi.GetProcessMemoryInfo(ctypes.windll.kernel32.GetCurrentProcess(),
+                                                 ctypes.byref(counters), counters.cb)
+        return counters.WorkingSetSize / 2 ** 20, counters.PeakWorkingSetSize / 2 ** 20
+
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (2 ** 20 if sys.platform == "darwin" else 2 ** 10)
+    try:
+        with open("/proc/self/statm") as f:
+            current = int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+    except OSError:
+        current = peak
+    return current, peak
+
+
+def run(reviewer="ImageReviewerMk3", report_file=None, repeat=2):
+    """Switch through every group of report_file in the reviewer; returns the results dict."""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtCore import QTimer, QEventLoop
+
+    module = importlib.import_module(reviewer)
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    # Time every ImagePanel.update_display() call
+    panel_times = []
+    original_update = module.ImagePanel.update_display
+
+    def timed_update(panel):
+        start = time.perf_counter()
+        original_update(panel)
+        panel_times.append(time.perf_counter() - start)
+
+    module.ImagePanel.update_display = timed_update
+
+    # Heartbeat: gaps between ticks show how long the event loop was blocked
+    gaps = []
+    last_tick = [time.perf_counter()]
+
+    def tick():
+        now = time.perf_counter()
+        gaps.append(now - last_tick[0])
+        last_tick[0] = now
+
+    heartbeat = QTimer()
+    heartbeat.setInterval(HEARTBEAT_MS)
+    heartbeat.timeout.connect(tick)
+
+    def settle(ms=3 * HEARTBEAT_MS):
+        """Run the event loop for a moment so pending paints and ticks are handled."""
+        loop = QEventLoop()
+        QTimer.singleShot(ms, loop.quit)
+        loop.exec()
+
+    try:
+        start = time.perf_counter()
+        window = module.MainWindow(report_file)
+        window.resize(1600, 900)
+        window.show()
+        settle()
+        open_ms = (time.perf_counter() - start) * 1000
+
+        samples = {}
+        clears = {}         # clear_group() times by the size of the group being cleared
+        heartbeat.start()
+        for _ in range(repeat):
+            for position in range(window.total_groups):
+                settle()
+                gaps.clear()
+                panel_times.clear()
+                last_tick[0] = time.perf_counter()
+
+                cleared = len(window.panels)
+                start = time.perf_counter()
+                window.clear_group()
+                if cleared:
+                    clears.setdefault(cleared, []).append((time.perf_counter() - start) * 1000)
+                start = time.perf_counter()
+                window.load_group(position)
+                load_ms = (time.perf_counter() - start) * 1000
+                app.processEvents()
+                switch_ms = (time.perf_counter() - start) * 1000
+                settle()
+
+                stalls = [g * 1000 for g in gaps if g * 1000 > STALL_MS]
+                samples.setdefault(len(window.panels), []).append({
+                    "switch_ms": switch_ms, "load_ms": load_ms,
+                    "panel_ms": 1000 * sum(panel_times) / max(1, len(panel_times)),
+                    "stalls": len(stalls), "max_stall_ms": max(stalls, default=0.0),
+                    "rss_mb": _memory_mb()[0],
+                })
+        heartbeat.stop()
+        # Clearing the biggest group last shows what tearing it down costs
+        cleared = len(window.panels)
+        start = time.perf_counter()
+        window.clear_group()
+        final_clear_ms = (time.perf_counter() - start) * 1000
+        if cleared:
+            clears.setdefault(cleared, []).append(final_clear_ms)
+        window.close()
+    finally:
+        module.ImagePanel.update_display = original_update
+
+    results = {"reviewer": reviewer, "open_ms": open_ms, "final_clear_ms": final_clear_ms,
+               "peak_rss_mb": _memory_mb()[1], "groups": {}}
+    for size, runs in sorted(samples.items()):
+        results["groups"][str(size)] = {
+            "switch_ms": median(r["switch_ms"] for r in runs),
+            "switch_ms_max": max(r["switch_ms"] for r in runs),
+            "load_ms": median(r["load_ms"] for r in runs),
+            "clear_ms": median(clears.get(size, [0.0])),
+            "panel_ms": median(r["panel_ms"] for r in runs),
+            "stalls": max(r["stalls"] for r in runs),
+            "max_stall_ms": max(r["max_stall_ms"] for r in runs),
+            "rss_mb": max(r["rss_mb"] for r in runs),
+        }
+    return results
+
+
+def print_results(results):
+    print(f"{results['reviewer']}: window opened in {results['open_ms']:.0f} ms, "
+          f"peak RSS {results['peak_rss_mb']:.0f} MB")
+    print(f"{'images':>7} {'switch ms':>10} {'max':>8} {'clear ms':>9} {'panel ms':>9} "
+          f"{'stalls':>7} {'max stall':>10} {'RSS MB':>8}")
+    for size, r in results["groups"].items():
+        print(f"{size:>7} {r['switch_ms']:>10.1f} {r['switch_ms_max']:>8.1f} {r['clear_ms']:>9.1f} "
+              f"{r['panel_ms']:>9.1f} {r['stalls']:>7} {r['max_stall_ms']:>10.1f} {r['rss_mb']:>8.0f}")
+
+
+def compare(results, baseline, tolerance=REGRESSION):
+    """Return a list of regressions against a baseline results dict."""
+    regressions = []
+    if results["peak_rss_mb"] > baseline["peak_rss_mb"] * tolerance:
+        regressions.append(f"peak RSS {baseline['peak_rss_mb']:.0f} -> {results['peak_rss_mb']:.0f} MB")
+    for size, r in results["groups"].items():
+        base = baseline["groups"].get(size)
+        if base is None:
+            continue
+        for metric in ("switch_ms", "clear_ms", "panel_ms", "max_stall_ms"):
+            # Ignore noise on very small timings
+            if r[metric] > max(base[metric] * tolerance, base[metric] + 5):
+                regressions.append(f"{size} images: {metric} {base[metric]:.1f} -> {r[metric]:.1f}")
+    return regressions
+
+
+def main(reviewer="ImageReviewerMk3", fixture_dir=FIXTURE_DIR, group_sizes=GROUP_SIZES, repeat=2,
+         output=None, baseline=None):
+    report_file = make_fixture(fixture_dir, group_sizes)
+    results = run(reviewer, report_file, repeat)
+    print_results(results)
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to: {output}")
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f))
+        for line in regressions:
+            print(f"⚠ Regression: {line}")
+        if regressions:
+            return 1
+        print("✅ No regressions against the baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,66 @@
+"""Multi-index hashing for near-duplicate lookups on hex image hashes.
+
+A hash is split into (tolerance + 1) bit segments. Two hashes that differ in
+at most `tolerance` bits must agree exactly on at least one segment
+(pigeonhole), so each query only checks hashes that share a segment instead
+of scanning the whole archive.
+"""
+from collections import defaultdict
+
+
+class HammingIndex:
+    def __init__(self, tolerance=0):
+        self.tolerance = tolerance
+        self.n_segments = tolerance + 1
+        self.exact = defaultdict(list)          # hex hash -> [items]
+        self.tables = [defaultdict(set) for _ in range(self.n_segments)]
+        self.values = {}                        # hex hash -> int value
+        self.n_bits = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def _segments(self, value):
+        step = -(-self.n_bits // self.n_segments)   # ceil division
+        mask = (1 << step) - 1
+        return [(value >> (i * step)) & mask for i in range(self.n_segments)]
+
+    def add(self, hex_hash, item):
+        """Register item (usually a path) under hex_hash."""
+        self.exact[hex_hash].append(item)
+        if hex_hash in self.values:
+            return
+        if self.n_bits is None:
+            self.n_bits = len(hex_hash) * 4
+        value = int(hex_hash, 16)
+        self.values[hex_hash] = value
+        if self.tolerance:
+            for table, seg in zip(self.tables, self._segments(value)):
+                table[seg].add(hex_hash)
+
+    @classmethod
+    def from_hashes(cls, hashes, tolerance=0):
+        """Build an index from an {item: hex hash} mapping, e.g. {file id: hash}."""
+        index = cls(tolerance)
+        for path, h in hashes.items():
+            if h:
+                index.add(h, path)
+        return index
+
+    def query(self, hex_hash):
+        """Return [(item, distance)] for every indexed item within tolerance."""
+        matches = [(item, 0) for item in self.exact.get(hex_hash, ())]
+        if not self.tolerance or self.n_bits is None or len(hex_hash) * 4 != self.n_bits:
+            return matches
+
+        value = int(hex_hash, 16)
+        seen = {hex_hash}
+        for table, seg in zip(self.tables, self._segments(value)):
+            for candidate in table.get(seg, ()):
+                if candidate in seen:
+                    continue
+                seen.add(candidate)
+                distance = (value ^ self.values[candidate]).bit_count()
+                if distance <= self.tolerance:
+                    matches.extend((item, distance) for item in self.exact[candidate])
+        return sorted(matches, key=lambda m: m[1])
@@ -0,0 +1,144 @@
+"""Light-weight hashing helpers shared by the scanners and their pool workers.
+
+Keep this module cheap to import: spawned workers load it (and only it) so
+nothing here should pull in PyQt6, torch, DeepImageSearch or tqdm.
+"""
+import os
+from datetime import datetime, timezone
+
+import imagehash
+import numpy as np
+from PIL import Image
+
+VALID_EXTS = {'.jpg', '.jpeg', '.png', '.bmp', '.gif', '.tiff', '.webp', '.heic'}
+
+HASH_FUNCS = {
+    "average_hash": imagehash.average_hash,
+    "phash": imagehash.phash,
+    "dhash": imagehash.dhash,
+    "whash": imagehash.whash,
+}
+
+DEFAULT_HASH = "phash"
+DEFAULT_HASH_SIZE = 16
+
+# Grayscale thumbnail kept for SSIM verification (verify.py). phash with
+# hash_size 16 works on exactly this image, so it costs nothing extra there.
+THUMB_SIZE = 64
+
+# EXIF tags for the capture time
+EXIF_IFD = 0x8769
+EXIF_DATETIME = 306
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_SUBSEC_ORIGINAL = 37521
+
+
+def iter_images(image_dir):
+    """Lazily walk a folder, yielding every file with an image extension."""
+    for dp, _, files in os.walk(image_dir):
+        for f in files:
+            if os.path.splitext(f.lower())[1] in VALID_EXTS:
+                yield os.path.join(dp, f)
+
+
+def find_images(image_dir):
+    """Walk a folder and return every file with an image extension."""
+    return list(iter_images(image_dir))
+
+
+class HashMismatch(ValueError):
+    """A cache or shard holds hashes made with another algorithm or hash size."""
+
+
+def check_hash_params(source, recorded, hashes, hash_name, hash_size):
+    """Raise HashMismatch unless the hashes stored in source are hash_name/hash_size hashes.
+
+    recorded is the [hash name, hash size] saved with them, or None for files
+    written before it was saved; those can only be checked on hash length.
+    """
+    if recorded:
+        if tuple(recorded) != (hash_name, hash_size):
+            raise HashMismatch(f"{source} holds {recorded[0]} hashes of size {recorded[1]}, not {hash_name} of "
+                               f"size {hash_size} (use --hash {recorded[0]} --hash-size {recorded[1]})")
+        return
+    first = next((h for h in hashes if h), None)
+    if first is not None and len(first) != -(-hash_size ** 2 // 4):
+        raise HashMismatch(f"{source} holds {len(first) * 4}-bit hashes, not hashes of size {hash_size}")
+
+
+def compute_hash(image_path, hash_name=DEFAULT_HASH, hash_size=DEFAULT_HASH_SIZE, source=None):
+    """Return (path, hex hash) or (path, None) if the image could not be read.
+
+    source can be an already-open file object holding the image bytes; the
+    file is read from image_path when it is not given.
+    """
+    try:
+        with Image.open(source if source is not None else image_path) as img:
+            img_hash = HASH_FUNCS[hash_name](img, hash_size=hash_size)
+        return (image_path, str(img_hash))
+    except Exception:
+        return (image_path, None)
+
+
+def _exif_time(img):
+    """EXIF capture time of an open image as a POSIX timestamp, 0 if there is none.
+
+    Camera clocks have no time zone, so the timestamp is the local capture
+    time read as if it were UTC.
+    """
+    try:
+        exif = img.getexif()
+        sub = exif.get_ifd(EXIF_IFD)
+        value = sub.get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+        subsec = sub.get(EXIF_SUBSEC_ORIGINAL)
+        t = datetime.strptime(str(value).strip("\x00 "), "%Y:%m:%d %H:%M:%S")
+        t = t.replace(tzinfo=timezone.utc).timestamp()
+        if subsec and str(subsec).strip().isdigit():
+            t += float("0." + str(subsec).strip())
+        return t
+    except Exception:
+        return 0
+
+
+def _thumbnail(img):
+    """THUMB_SIZE x THUMB_SIZE grayscale copy of an open image (exactly what phash starts from)."""
+    return img.convert("L").resize((THUMB_SIZE, THUMB_SIZE), Image.LANCZOS)
+
+
+def hash_with_time(image_path, hash_name=DEFAULT_HASH, hash_size=DEFAULT_HASH_SIZE, source=None):
+    """Return (path, hex hash or None, capture time or 0, thumbnail array or None).
+
+    The image is opened and decoded once for the hash, the time and the
+    thumbnail.
+    """
+    try:
+        with Image.open(source if source is not None else image_path) as img:
+            t = _exif_time(img)
+            thumb = _thumbnail(img)
+            if hash_name == "phash" and hash_size * 4 == THUMB_SIZE:
+                # phash would convert and resize to this very image again
+                img_hash = imagehash.phash(thumb, hash_size=hash_size)
+            else:
+                img_hash = HASH_FUNCS[hash_name](img, hash_size=hash_size)
+        return (image_path, str(img_hash), t, np.asarray(thumb, dtype=np.uint8))
+    except Exception:
+        return (image_path, None, 0, None)
+
+
+def capture_time(image_path):
+    """Return (path, EXIF capture time as a POSIX timestamp) or (path, 0) if there is none.
+
+    Only the header is read, no pixels are decoded.
+    """
+    try:
+        with Image.open(image_path) as img:
+            return (image_path, _exif_time(img))
+    except Exception:
+        return (image_path, 0)
+
+
+def worker_probe(_=None):
+    """Report what a pool worker has imported (used by the startup benchmark)."""
+    import sys
+    heavy = ("PyQt6", "torch", "DeepImageSearch", "scipy", "tqdm", "timm")
+    return len(sys.modules), sorted(m for m in heavy if m in sys.modules)
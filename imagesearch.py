@@ -0,0 +1,344 @@
+"""Command-line entry point for the image search tools.
+
+    python imagesearch.py scan E:/Pictures
+    python imagesearch.py group
+    python imagesearch.py query F:/DCIM --stream
+    python imagesearch.py review
+    python imagesearch.py resolve --keep largest --apply
+
+Heavy modules (imagehash, PyQt6, DeepImageSearch...) are only imported inside
+the subcommand that needs them, so `--help` and pool worker start-up stay fast.
+"""
+import os
+import sys
+import argparse
+
+DEFAULT_CACHE = "image_hashes.json"
+DEFAULT_REPORT = "duplicates.json"
+
+
+def cmd_scan(args):
+    import Mark3
+    Mark3.scan(args.image_dir, args.cache, args.processes, args.hash, args.hash_size, args.readers,
+               archives=not args.no_archives, thumbs_dir=None if args.no_thumbs else args.thumbs_dir)
+    if args.group:
+        cmd_group(args)
+
+
+def cmd_group(args):
+    import Mark3
+    table, hashes = Mark3.load_cached_hashes(args.cache)
+    duplicates = Mark3.group(hashes, args.tolerance)
+    # Hamming groups are candidates only; like Mark3.main, always confirm them
+    if args.verify or args.tolerance:
+        import verify
+        duplicates = verify.verify_duplicates(table, duplicates, args.thumbs_dir, args.processes)
+    Mark3.save_duplicates(table, duplicates, args.report)
+
+
+def cmd_query(args):
+    import query
+    matches = query.query(args.incoming_dir, args.cache, args.tolerance, args.processes,
+                          args.hash, args.hash_size, stream=args.stream)
+    query.save_matches(matches, args.output)
+
+
+def cmd_bursts(args):
+    import bursts
+    bursts.find_bursts(args.cache, args.report, args.processes, args.window, args.max_distance)
+
+
+def cmd_estimate(args):
+    import estimate
+    estimate.estimate(args.image_dir, args.sample, args.cache, args.processes, args.hash, args.hash_size)
+
+
+def cmd_partial(args):
+    import partial_dups
+    groups = partial_dups.find_partial_duplicates(args.image_dir, args.features_dir, args.processes)
+    partial_dups.save_partial_duplicates(groups, args.report)
+
+
+def cmd_embed(args):
+    import embeddings
+    from hashing import find_images
+
+    image_list = find_images(args.image_dir)
+    if args.benchmark:
+        embeddings.benchmark(image_list, args.model, args.benchmark, model_dir=args.model_dir)
+        return
+    model = embeddings.get_backend(args.backend, args.model, image_list, args.model_dir)
+    paths, emb = embeddings.embed(image_list, model, args.batch_size)
+    embeddings.save_embeddings(paths, emb, args.output, args.paths_output)
+
+
+def _namespaced(values):
+    """Parse name=path arguments (a bare path gets its folder name)."""
+    pairs = []
+    for value in values:
+        name, sep, path = value.partition("=")
+        pairs.append((name, path) if sep else (os.path.basename(os.path.normpath(value)), value))
+    return pairs
+
+
+def cmd_shard(args):
+    import shards
+    namespace = args.namespace or os.path.basename(os.path.normpath(args.root))
+    output = args.output or os.path.join(shards.SHARD_DIR, f"{namespace}.json")
+    n = shards.hash_tree(args.root, namespace, output, args.processes, args.hash, args.hash_size)
+    print(f"{n} hashes written to {output}")
+
+
+def cmd_merge(args):
+    import shards
+    shards.merge(args.shards, args.report, dict(_namespaced(args.mount)))
+
+
+def cmd_coordinate(args):
+    import shards
+    _, failed = shards.coordinate(_namespaced(args.roots), args.shard_dir, args.report, args.local_workers,
+                                  args.processes, args.host, args.port, args.authkey and args.authkey.encode(),
+                                  dict(_namespaced(args.mount)))
+    return 1 if failed else 0
+
+
+def cmd_worker(args):
+    import shards
+    host, _, port = args.connect.rpartition(":")
+    shards.run_worker((host, int(port)), args.authkey.encode(), args.processes)
+
+
+def cmd_serve(args):
+    import server
+    server.serve(args.host, args.port, cache_file=args.cache, embeddings_file=args.embeddings,
+                 embedding_paths_file=args.embedding_paths, hash_name=args.hash, hash_size=args.hash_size)
+
+
+def cmd_review(args):
+    from PyQt6.QtWidgets import QApplication
+    from ImageReviewerMk3 import MainWindow
+
+    app = QApplication(sys.argv[:1])
+    window = MainWindow(args.report)
+    window.showMaximized()
+    return app.exec()
+
+
+def cmd_resolve(args):
+    import resolve
+    resolve.resolve(args.report, keep=args.keep, move_to=args.move_to, dry_run=not args.apply)
+
+
+def cmd_bench(args):
+    """Measure CLI start-up time and the cost of spawning hashing workers."""
+    import time
+    import subprocess
+    import multiprocessing
+
+    runs = []
+    for _ in range(args.repeat):
+        start = time.perf_counter()
+        subprocess.run([sys.executable, os.path.abspath(__file__), "--help"],
+                       stdout=subprocess.DEVNULL, check=True)
+        runs.append(time.perf_counter() - start)
+    print(f"CLI start-up (--help): best {min(runs) * 1000:.0f} ms over {args.repeat} runs")
+
+    import hashing
+    ctx = multiprocessing.get_context("spawn")
+    start = time.perf_counter()
+    with ctx.Pool(processes=args.processes) as pool:
+        probes = pool.map(hashing.worker_probe, range(args.processes), chunksize=1)
+    elapsed = time.perf_counter() - start
+    n_modules = max(p[0] for p in probes)
+    heavy = sorted({m for _, mods in probes for m in mods})
+    print(f"Spawned {args.processes} workers in {elapsed * 1000:.0f} ms "
+          f"({elapsed / args.processes * 1000:.0f} ms/worker, {n_modules} modules loaded)")
+    if heavy:
+        print(f"⚠ Workers imported heavy modules: {', '.join(heavy)}")
+        return 1
+    return 0
+
+
+def cmd_bench_gui(args):
+    import gui_bench
+    return gui_bench.main(args.reviewer, args.fixture_dir, args.sizes, args.repeat, args.output, args.baseline)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="imagesearch", description="Find and review duplicate images.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def add_cache(p):
+        p.add_argument("--cache", default=DEFAULT_CACHE, help="hash cache file (default: %(default)s)")
+
+    def add_report(p):
+        p.add_argument("--report", default=DEFAULT_REPORT, help="duplicates report (default: %(default)s)")
+
+    def add_grouping(p):
+        p.add_argument("-t", "--tolerance", type=int, default=0,
+                       help="also group hashes up to this Hamming distance apart (0 = exact)")
+        p.add_argument("--verify", action="store_true",
+                       help="confirm groups with SSIM on cached thumbnails, dropping false positives "
+                            "(always done with --tolerance > 0)")
+        p.add_argument("--thumbs-dir", default="thumbs", help="thumbnail cache folder (default: %(default)s)")
+
+    p = sub.add_parser("scan", help="hash new images under a folder into the cache")
+    p.add_argument("image_dir")
+    p.add_argument("-j", "--processes", type=int, default=max(1, os.cpu_count() - 1))
+    p.add_argument("--hash", default="phash", choices=["average_hash", "phash", "dhash", "whash"])
+    p.add_argument("--hash-size", type=int, default=16)
+    p.add_argument("--readers", type=int, default=4,
+                   help="read-ahead disk readers feeding the workers (0 = workers read files themselves)")
+    p.add_argument("--no-archives", action="store_true", help="skip images inside .zip/.tar archives")
+    p.add_argument("--no-thumbs", action="store_true",
+                   help="don't keep verification thumbnails (4 KB per image) while hashing")
+    p.add_argument("--group", action="store_true", help="also write the duplicates report")
+    add_grouping(p)
+    add_cache(p)
+    add_report(p)
+    p.set_defaults(func=cmd_scan)
+
+    p = sub.add_parser("group", help="group cached hashes into a duplicates report")
+    p.add_argument("-j", "--processes", type=int, default=max(1, os.cpu_count() - 1))
+    add_grouping(p)
+    add_cache(p)
+    add_report(p)
+    p.set_defaults(func=cmd_group)
+
+    p = sub.add_parser("query", help="check an incoming folder against the hashed archive")
+    p.add_argument("incoming_dir")
+    p.add_argument("-t", "--tolerance", type=int, default=0, help="max Hamming distance (0 = exact)")
+    p.add_argument("-j", "--processes", type=int, default=max(1, os.cpu_count() - 1))
+    p.add_argument("--hash", default="phash", choices=["average_hash", "phash", "dhash", "whash"])
+    p.add_argument("--hash-size", type=int, default=16)
+    p.add_argument("--stream", action="store_true", help="print matches as soon as they are found")
+    p.add_argument("-o", "--output", default="matches.json")
+    add_cache(p)
+    p.set_defaults(func=cmd_query)
+
+    p = sub.add_parser("estimate", help="estimate duplicates and reclaimable space from a random sample")
+    p.add_argument("image_dir")
+    p.add_argument("--sample", type=int, default=20000, help="images to hash (default: %(default)s)")
+    p.add_argument("-j", "--processes", type=int, default=max(1, os.cpu_count() - 1))
+    p.add_argument("--hash", default="phash", choices=["average_hash", "phash", "dhash", "whash"])
+    p.add_argument("--hash-size", type=int, default=16)
+    add_cache(p)
+    p.set_defaults(func=cmd_estimate)
+
+    p = sub.add_parser("bursts", help="group burst shots by EXIF capture time and similar hashes")
+    p.add_argument("-j", "--processes", type=int, default=max(1, os.cpu_count() - 1))
+    p.add_argument("--window", type=float, default=3.0, help="max seconds between frames (default: %(default)s)")
+    p.add_argument("--max-distance", type=float, default=0.2,
+                   help="max Hamming distance as a fraction of the hash bits (default: %(default)s)")
+    p.add_argument("--report", default="bursts.json", help="output report (default: %(default)s)")
+    add_cache(p)
+    p.set_defaults(func=cmd_bursts)
+
+    p = sub.add_parser("partial", help="find crops and edited copies using local features")
+    p.add_argument("image_dir")
+    p.add_argument("-j", "--processes", type=int, default=max(1, os.cpu_count() - 1))
+    p.add_argument("--features-dir", default="local_features", help="feature cache folder (default: %(default)s)")
+    p.add_argument("--report", default="partial_duplicates.json", help="output report (default: %(default)s)")
+    p.set_defaults(func=cmd_partial)
+
+    p = sub.add_parser("embed", help="compute CNN embeddings on the CPU (int8 ONNX by default)")
+    p.add_argument("image_dir")
+    p.add_argument("--model", default="vgg19", help="timm model name (default: %(default)s)")
+    p.add_argument("--backend", default="onnx-int8", choices=["onnx-int8", "onnx-fp32", "torch"])
+    p.add_argument("--batch-size", type=int, default=32)
+    p.add_argument("--model-dir", default="models", help="where exported models are kept")
+    p.add_argument("--benchmark", type=int, metavar="N", help="compare backends on N images instead")
+    p.add_argument("-o", "--output", default="embeddings.npy")
+    p.add_argument("--paths-output", default="embedding_paths.json")
+    p.set_defaults(func=cmd_embed)
+
+    p = sub.add_parser("shard", help="hash one root into an independent shard file")
+    p.add_argument("root")
+    p.add_argument("--namespace", help="name of this root in merged reports (default: folder name)")
+    p.add_argument("-o", "--output", help="shard file (default: shards/<namespace>.json)")
+    p.add_argument("-j", "--processes", type=int, default=max(1, os.cpu_count() - 1))
+    p.add_argument("--hash", default="phash", choices=["average_hash", "phash", "dhash", "whash"])
+    p.add_argument("--hash-size", type=int, default=16)
+    p.set_defaults(func=cmd_shard)
+
+    p = sub.add_parser("merge", help="sort-merge shard files into one duplicates report")
+    p.add_argument("shards", nargs="+")
+    p.add_argument("--mount", action="append", default=[], metavar="NAMESPACE=PATH",
+                   help="where a shard's root is reachable from this machine")
+    add_report(p)
+    p.set_defaults(func=cmd_merge)
+
+    p = sub.add_parser("coordinate", help="hand out directories to hashing workers, then merge")
+    p.add_argument("roots", nargs="+", metavar="NAMESPACE=ROOT")
+    p.add_argument("--shard-dir", default="shards")
+    p.add_argument("--local-workers", type=int, default=0, help="also start this many workers here")
+    p.add_argument("-j", "--processes", type=int, default=4, help="hashing processes per local worker")
+    p.add_argument("--host", default="127.0.0.1",
+                   help="address to listen on; only expose it on a trusted network (workers send pickles)")
+    p.add_argument("--port", type=int, default=50505)
+    p.add_argument("--authkey", help="key the workers must present (default: a random key, printed at start)")
+    p.add_argument("--mount", action="append", default=[], metavar="NAMESPACE=PATH")
+    add_report(p)
+    p.set_defaults(func=cmd_coordinate)
+
+    p = sub.add_parser("worker", help="hash directories handed out by a coordinator")
+    p.add_argument("--connect", required=True, metavar="HOST:PORT")
+    p.add_argument("--authkey", required=True, help="key printed by the coordinator")
+    p.add_argument("-j", "--processes", type=int, default=max(1, os.cpu_count() - 1))
+    p.set_defaults(func=cmd_worker)
+
+    p = sub.add_parser("serve", help="answer duplicate/similarity lookups over localhost HTTP")
+    p.add_argument("--host", default="127.0.0.1")
+    p.add_argument("--port", type=int, default=8765)
+    p.add_argument("--hash", default="phash", choices=["average_hash", "phash", "dhash", "whash"])
+    p.add_argument("--hash-size", type=int, default=16)
+    p.add_argument("--embeddings", default="embeddings.npy")
+    p.add_argument("--embedding-paths", default="embedding_paths.json")
+    add_cache(p)
+    p.set_defaults(func=cmd_serve)
+
+    p = sub.add_parser("review", help="open the duplicates report in the reviewer GUI")
+    add_report(p)
+    p.set_defaults(func=cmd_review)
+
+    p = sub.add_parser("resolve", help="keep one file per group and remove the rest")
+    p.add_argument("--keep", default="largest",
+                   choices=["first", "largest", "smallest", "oldest", "newest", "shortest-path"])
+    p.add_argument("--move-to", help="move duplicates here instead of deleting them")
+    p.add_argument("--apply", action="store_true", help="actually remove files (default is a dry run)")
+    add_report(p)
+    p.set_defaults(func=cmd_resolve)
+
+    p = sub.add_parser("bench", help="measure start-up and worker spawn cost")
+    p.add_argument("-j", "--processes", type=int, default=4)
+    p.add_argument("--repeat", type=int, default=3)
+    p.set_defaults(func=cmd_bench)
+
+    p = sub.add_parser("bench-gui", help="measure reviewer group switching offscreen on generated groups")
+    p.add_argument("--reviewer", default="ImageReviewerMk3",
+                   choices=["ImageReviewer", "ImageReviewerMk2", "ImageReviewerMk3"])
+    p.add_argument("--sizes", type=int, nargs="+", default=[2, 10, 50, 200, 500], help="images per group")
+    p.add_argument("--repeat", type=int, default=2, help="passes over all groups (default: %(default)s)")
+    p.add_argument("--fixture-dir", default="gui_bench_fixture")
+    p.add_argument("-o", "--output", help="save the results as JSON")
+    p.add_argument("--baseline", help="results JSON to compare against; exit 1 on a regression")
+    p.set_defaults(func=cmd_bench_gui)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args) or 0
+    except ValueError as e:
+        # A cache or shard built with other --hash/--hash-size settings
+        from hashing import HashMismatch
+        if not isinstance(e, HashMismatch):
+            raise
+        print(f"⚠ {e}")
+        return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,27 +1,54 @@
-from DeepImageSearch import Load_Data, Search_Setup
+# "deepimagesearch" = original DeepImageSearch/PyTorch path, "onnx-int8" = quantized CPU path (embeddings.py)
+BACKEND = "onnx-int8"
+IMAGE_DIR = "test-data"
+MODEL_NAME = "vgg19"
 
-dl = Load_Data()
 
-image_list = dl.from_folder(["test-data"])
+def main_deepimagesearch():
+    from DeepImageSearch import Load_Data, Search_Setup
 
-# Set up the search engine, You can load 'vit_base_patch16_224_in21k', 'resnet50' etc more then 500+ models
-st = Search_Setup(image_list, model_name="vgg19", pretrained=True, image_count=None)
+    dl = Load_Data()
 
-# Index the images
-#st.run_index()
+    image_list = dl.from_folder([IMAGE_DIR])
 
-# Get metadata
-metadata = st.get_image_metadata_file()
-#st.plot_similar_images("E:/Pictures/100ANDRO/DSC_0043.JPG", number_of_images=6)
+    # Set up the search engine, You can load 'vit_base_patch16_224_in21k', 'resnet50' etc more then 500+ models
+    st = Search_Setup(image_list, model_name=MODEL_NAME, pretrained=True, image_count=None)
 
-no_of_images = len(image_list)
+    # Index the images
+    #st.run_index()
 
-for i in range(no_of_images):
-    #for j in range(i+1, no_of_images):
-        #print(f"Comparing image {image_list[i]} and {image_list[j]}")
-        print(f"Comparing image {image_list[i]}")
-        # Get similar images
-        print(st.get_similar_images(image_path=image_list[i], number_of_images=10))
-        # Plot similar images
-        # st.plot_similar_images(image_path=image_list[i], number_of_images=9)
+    # Get metadata
+    metadata = st.get_image_metadata_file()
+    #st.plot_similar_images("E:/Pictures/100ANDRO/DSC_0043.JPG", number_of_images=6)
 
+    no_of_images = len(image_list)
+
+    for i in range(no_of_images):
+        #for j in range(i+1, no_of_images):
+            #print(f"Comparing image {image_list[i]} and {image_list[j]}")
+            print(f"Comparing image {image_list[i]}")
+            # Get similar images
+            print(st.get_similar_images(image_path=image_list[i], number_of_images=10))
+            # Plot similar images
+            # st.plot_similar_images(image_path=image_list[i], number_of_images=9)
+
+
+def main_onnx():
+    import embeddings
+    from hashing import find_images
+
+    image_list = find_images(IMAGE_DIR)
+    model = embeddings.get_backend(BACKEND, MODEL_NAME, calibration_paths=image_list)
+    paths, emb = embeddings.embed(image_list, model)
+    embeddings.save_embeddings(paths, emb)
+
+    for i, neighbours in enumerate(embeddings.nearest(emb, min(10, len(paths) - 1))):
+        print(f"Comparing image {paths[i]}")
+        print([paths[j] for j in neighbours])
+
+
+if __name__ == "__main__":
+    if BACKEND == "deepimagesearch":
+        main_deepimagesearch()
+    else:
+        main_onnx()
@@ -0,0 +1,258 @@
+"""Partial-duplicate detection (crops, screenshots, overlays) with local features.
+
+Global hashes and whole-image embeddings both change when a photo is cropped
+or has something drawn on it, but most of its local features survive. This
+module:
+
+1. extracts ORB binary features once per image (from a reduced-size decode)
+   and caches them in FEATURES_DIR,
+2. turns every descriptor into visual words by bit-sampling LSH (no
+   vocabulary training needed for binary descriptors) and builds an inverted
+   index, so each image only meets the images it shares words with,
+3. runs geometric verification (descriptor matching + RANSAC) only on the
+   top-ranked candidates.
+
+Everything runs on the CPU; OpenCV is only imported inside the workers.
+"""
+import os
+import json
+from multiprocessing import Pool
+
+import numpy as np
+from PIL import Image
+
+# --- CONFIGURATION ---
+FEATURES_DIR = "local_features"
+PARTIAL_DUPLICATES_FILE = "partial_duplicates.json"
+MAX_SIDE = 640            # decode/resize images to this size before extracting features
+N_FEATURES = 200          # ORB keypoints per image
+WORD_BITS = 18            # descriptor bits sampled per visual word
+N_TABLES = 2              # independent bit samplings (more = better recall, bigger index)
+MAX_POSTINGS = 2000       # words shared by more images than this are ignored (stop words)
+MIN_SHARED_WORDS = 8      # candidates must share at least this many words
+TOP_K = 10                # candidates per image sent to geometric verification
+MIN_INLIERS = 15          # RANSAC inliers needed to call two images partial duplicates
+SCALE_RANGE = (0.1, 10)   # a crop/resize between these scales; anything else is a degenerate fit
+SEED = 1234
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+_BIT_POSITIONS = np.stack([np.random.default_rng(SEED + t).choice(256, WORD_BITS, replace=False)
+                           for t in range(N_TABLES)])
+
+
+# --- FEATURE EXTRACTION ---
+def extract_features(image_path):
+    """Return (path, keypoints Nx2 float32, descriptors Nx32 uint8) or (path, None, None)."""
+    import cv2
+
+    try:
+        with Image.open(image_path) as img:
+            img.draft("L", (MAX_SIDE, MAX_SIDE))   # cheap reduced-size JPEG decode
+            img = img.convert("L")
+            img.thumbnail((MAX_SIDE, MAX_SIDE))
+            gray = np.asarray(img)
+        orb = cv2.ORB_create(nfeatures=N_FEATURES)
+        keypoints, desc = orb.detectAndCompute(gray, None)
+        if desc is None or len(keypoints) == 0:
+            return (image_path, None, None)
+        # Store coordinates relative to the image size so rescaled copies line up
+        scale = float(max(gray.shape))
+        kps = np.array([kp.pt for kp in keypoints], dtype=np.float32) / scale
+        return (image_path, kps, desc)
+    except Exception:
+        return (image_path, None, None)
+
+
+def load_features(features_dir=FEATURES_DIR, mmap=True):
+    """Load the feature cache: (paths, offsets, keypoints, descriptors)."""
+    if not os.path.exists(os.path.join(features_dir, "paths.json")):
+        return [], np.zeros(1, dtype=np.int64), np.zeros((0, 2), np.float32), np.zeros((0, 32), np.uint8)
+    mode = "r" if mmap else None
+    with open(os.path.join(features_dir, "paths.json"), "r", encoding="utf-8") as f:
+        paths = json.load(f)
+    offsets = np.load(os.path.join(features_dir, "offsets.npy"))
+    kps = np.load(os.path.join(features_dir, "kps.npy"), mmap_mode=mode)
+    desc = np.load(os.path.join(features_dir, "desc.npy"), mmap_mode=mode)
+    return paths, offsets, kps, desc
+
+
+def update_features(image_paths, features_dir=FEATURES_DIR, processes=4):
+    """Extract features for images not yet in the cache and append them."""
+    from tqdm import tqdm
+
+    paths, offsets, kps, desc = load_features(features_dir, mmap=False)
+    known = set(paths)
+    new_images = [p for p in image_paths if p not in known]
+    print(f"{len(new_images)} new images to extract local features from, using {processes} cores...")
+    if not new_images:
+        return
+
+    new_paths, new_kps, new_desc = [], [kps], [desc]
+    counts = list(np.diff(offsets))
+    with Pool(processes=processes) as pool:
+        for path, k, d in tqdm(pool.imap_unordered(extract_features, new_images, chunksize=8),
+                               total=len(new_images)):
+            if d is None:
+                continue
+            new_paths.append(path)
+            new_kps.append(k)
+            new_desc.append(d)
+            counts.append(len(d))
+
+    os.makedirs(features_dir, exist_ok=True)
+    np.save(os.path.join(features_dir, "offsets.npy"), np.concatenate([[0], np.cumsum(counts)]).astype(np.int64))
+    np.save(os.path.join(features_dir, "kps.npy"), np.concatenate(new_kps))
+    np.save(os.path.join(features_dir, "desc.npy"), np.concatenate(new_desc))
+    with open(os.path.join(features_dir, "paths.json"), "w", encoding="utf-8") as f:
+        json.dump(paths + new_paths, f)
+
+
+# --- INVERTED INDEX ---
+def visual_words(desc):
+    """Map Nx32 descriptors to N x N_TABLES visual word ids."""
+    bits = np.unpackbits(np.asarray(desc), axis=1)
+    weights = (1 << np.arange(WORD_BITS, dtype=np.int64))
+    words = np.stack([bits[:, pos].astype(np.int64) @ weights for pos in _BIT_POSITIONS], axis=1)
+    return words + (np.arange(N_TABLES, dtype=np.int64) << WORD_BITS)
+
+
+def build_index(offsets, desc, features_dir=FEATURES_DIR):
+    """Build and save the inverted index (word -> images) next to the features."""
+    n_images = len(offsets) - 1
+    image_of = np.repeat(np.arange(n_images, dtype=np.int64), np.diff(offsets))
+    words = visual_words(desc)
+    np.save(os.path.join(features_dir, "words.npy"), words)
+
+    # One posting per (word, image), sorted by word
+    n_words = N_TABLES << WORD_BITS
+    pairs = np.unique(words * n_images + image_of[:, None])
+    postings = pairs % n_images
+    df = np.bincount(pairs // n_images, minlength=n_words)
+    starts = np.concatenate([[0], np.cumsum(df)])
+    idf = np.where(df > 0, np.log((n_images + 1) / np.maximum(df, 1)), 0.0)
+    idf[df > MAX_POSTINGS] = 0.0
+    np.save(os.path.join(features_dir, "postings.npy"), postings)
+    np.save(os.path.join(features_dir, "starts.npy"), starts)
+    np.save(os.path.join(features_dir, "idf.npy"), idf.astype(np.float32))
+
+
+# Arrays opened (memory-mapped) once per worker
+_index = {}
+
+
+def _init_worker(features_dir):
+    _, offsets, kps, desc = load_features(features_dir)
+    _index.update(offsets=offsets, kps=kps, desc=desc)
+    for name in ("words", "postings", "starts", "idf"):
+        _index[name] = np.load(os.path.join(features_dir, f"{name}.npy"), mmap_mode="r")
+
+
+def find_candidates(image_ids):
+    """Return candidate (i, j) pairs, i < j, for the given query images."""
+    offsets, words, postings, starts, idf = (_index[k] for k in ("offsets", "words", "postings", "starts", "idf"))
+    pairs = []
+    for i in image_ids:
+        w = np.unique(words[offsets[i]:offsets[i + 1]])
+        w = w[idf[w] > 0]
+        lengths = starts[w + 1] - starts[w]
+        if not lengths.sum():
+            continue
+        # Gather all postings lists of this image's words in one vectorised step
+        first = np.repeat(starts[w] - np.concatenate([[0], np.cumsum(lengths)[:-1]]), lengths)
+        hits = postings[first + np.arange(lengths.sum())]
+        images, inverse = np.unique(hits, return_inverse=True)
+        shared = np.bincount(inverse)
+        score = np.bincount(inverse, weights=np.repeat(idf[w], lengths))
+        ok = (images != i) & (shared >= MIN_SHARED_WORDS)
+        images, score = images[ok], score[ok]
+        for j in images[np.argsort(-score)[:TOP_K]]:
+            pairs.append((min(i, int(j)), max(i, int(j))))
+    return pairs
+
+
+def verify_pair(pair):
+    """Geometric verification: one-to-one ratio-test matches + RANSAC similarity transform.
+
+    Returns (pair, inliers), counting each target keypoint once and 0 when the
+    transform collapses or blows the image up beyond SCALE_RANGE.
+    """
+    import cv2
+
+    i, j = pair
+    offsets, kps, desc = _index["offsets"], _index["kps"], _index["desc"]
+    d1, d2 = desc[offsets[i]:offsets[i + 1]], desc[offsets[j]:offsets[j + 1]]
+    if len(d1) < MIN_INLIERS or len(d2) < MIN_INLIERS:
+        return pair, 0
+    dist = _POPCOUNT[np.bitwise_xor(d1[:, None, :], d2[None, :, :])].sum(axis=2, dtype=np.int32)
+    nearest = np.argpartition(dist, 1, axis=1)[:, :2]
+    rows = np.arange(len(d1))
+    best, second = dist[rows, nearest[:, 0]], dist[rows, nearest[:, 1]]
+    swap = best > second
+    best, second = np.where(swap, second, best), np.where(swap, best, second)
+    match = np.where(swap, nearest[:, 1], nearest[:, 0])
+    # Cross-check: keep a match only if the query is also the target's nearest descriptor,
+    # so several query features can't all land on the same target keypoint
+    mutual = np.argmin(dist, axis=0)[match] == rows
+    good = (best < 64) & (best < 0.8 * second) & mutual
+    if good.sum() < MIN_INLIERS:
+        return pair, 0
+    src = np.asarray(kps[offsets[i]:offsets[i + 1]])[good]
+    dst = np.asarray(kps[offsets[j]:offsets[j + 1]])[match[good]]
+    transform, inliers = cv2.estimateAffinePartial2D(src, dst, method=cv2.RANSAC, ransacReprojThreshold=0.01)
+    if transform is None or inliers is None:
+        return pair, 0
+    scale = float(np.hypot(transform[0, 0], transform[1, 0]))
+    if not SCALE_RANGE[0] <= scale <= SCALE_RANGE[1]:
+        return pair, 0
+    return pair, len(np.unique(match[good][inliers.ravel() > 0]))
+
+
+def _group_pairs(pairs, paths):
+    parent = {}
+
+    def find(x):
+        parent.setdefault(x, x)
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for i, j in pairs:
+        parent[find(i)] = find(j)
+    groups = {}
+    for x in list(parent):
+        groups.setdefault(find(x), []).append(paths[x])
+    return [sorted(g) for g in groups.values()]
+
+
+def find_partial_duplicates(image_dir, features_dir=FEATURES_DIR, processes=4):
+    """Extract/cached features, query the inverted index and verify candidates."""
+    from hashing import find_images
+
+    update_features(find_images(image_dir), features_dir, processes)
+    paths, offsets, _, desc = load_features(features_dir)
+    if not paths:
+        return []
+    build_index(offsets, desc, features_dir)
+
+    chunks = [range(s, min(s + 256, len(paths))) for s in range(0, len(paths), 256)]
+    with Pool(processes=processes, initializer=_init_worker, initargs=(features_dir,)) as pool:
+        candidates = set()
+        for found in pool.imap_unordered(find_candidates, chunks):
+            candidates.update(found)
+        print(f"Verifying {len(candidates)} candidate pairs...")
+        verified = [pair for pair, inliers in pool.imap_unordered(verify_pair, candidates, chunksize=64)
+                    if inliers >= MIN_INLIERS]
+    return _group_pairs(verified, paths)
+
+
+def save_partial_duplicates(groups, report_file=PARTIAL_DUPLICATES_FILE):
+    # Same format as duplicates.json so the reviewers can open it
+    from report import save_path_groups
+
+    save_path_groups({f"partial-{n}": g for n, g in enumerate(groups, 1)}, report_file)
+    print(f"{len(groups)} partial-duplicate groups saved to: {report_file}")
+
+
+if __name__ == "__main__":
+    save_partial_duplicates(find_partial_duplicates("E:/Pictures"))
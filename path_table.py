@@ -0,0 +1,180 @@
+"""Interned path table: every directory stored once, every file an integer id.
+
+With millions of files the same long `E:/Pictures/...` prefixes were held
+over and over (cache keys, image lists, hash groups, duplicates.json). Here a
+file is just (directory id, file name) and is passed around as its id.
+On disk, directories are prefix-compressed against their parent directory:
+
+    "dirs":  [[-1, "E:/"], [0, "Pictures"], [1, "\\2019"], [2, "\\Trip"], ...]
+    "files": [[3, "IMG_0001.JPG"], ...]
+
+Run `python path_table.py [n_files]` to compare memory use and file size
+against plain path strings on a synthetic tree (2M files by default).
+"""
+import os
+from array import array
+
+
+class PathTable:
+    def __init__(self):
+        self.dir_paths = []          # dir id -> full directory path
+        self._dir_ids = {}           # full directory path -> dir id
+        self.file_dir = array("I")   # file id -> dir id
+        self.file_name = []          # file id -> file name
+        self._files_in = []          # dir id -> {file name: file id}
+
+    def __len__(self):
+        return len(self.file_name)
+
+    def add_dir(self, dir_path):
+        dir_id = self._dir_ids.get(dir_path)
+        if dir_id is None:
+            dir_id = len(self.dir_paths)
+            self.dir_paths.append(dir_path)
+            self._dir_ids[dir_path] = dir_id
+            self._files_in.append({})
+        return dir_id
+
+    def add_file(self, dir_id, name):
+        """Return the id of name inside dir_id, adding it if it is new."""
+        files = self._files_in[dir_id]
+        file_id = files.get(name)
+        if file_id is None:
+            file_id = len(self.file_name)
+            self.file_dir.append(dir_id)
+            self.file_name.append(name)
+            files[name] = file_id
+        return file_id
+
+    def add(self, path):
+        dir_path, name = os.path.split(path)
+        return self.add_file(self.add_dir(dir_path), name)
+
+    def find(self, path):
+        """Return the id of path, or None if it is not in the table."""
+        dir_path, name = os.path.split(path)
+        dir_id = self._dir_ids.get(dir_path)
+        return None if dir_id is None else self._files_in[dir_id].get(name)
+
+    def path(self, file_id):
+        return os.path.join(self.dir_paths[self.file_dir[file_id]], self.file_name[file_id])
+
+    def walk(self, image_dir, exts):
+        """Walk image_dir, intern every file with one of exts and return their ids."""
+        ids = array("I")
+        for dp, _, files in os.walk(image_dir):
+            dir_id = None
+            for f in files:
+                if os.path.splitext(f.lower())[1] in exts:
+                    if dir_id is None:
+                        dir_id = self.add_dir(dp)
+                    ids.append(self.add_file(dir_id, f))
+        return ids
+
+    # --- ON-DISK FORMAT ---
+    def dump_dirs(self, dir_ids=None):
+        """Prefix-compress directories as [parent row, suffix] (parent -1 = root).
+
+        Every ancestor gets a row of its own so shared prefixes are written
+        once. With dir_ids only those directories (and their ancestors) are
+        written; returns (rows, {dir id: row index}).
+        """
+        wanted = range(len(self.dir_paths)) if dir_ids is None else sorted(set(dir_ids))
+        rows, row_of_path = [], {}
+
+        def emit(path):
+            row = row_of_path.get(path)
+            if row is not None:
+                return row
+            parent = os.path.dirname(path)
+            if parent and parent != path:
+                parent_row = emit(parent)
+                rows.append([parent_row, path[len(parent):]])
+            else:
+                rows.append([-1, path])
+            row_of_path[path] = len(rows) - 1
+            return row_of_path[path]
+
+        row_of = {dir_id: emit(self.dir_paths[dir_id]) for dir_id in wanted}
+        return rows, row_of
+
+    @staticmethod
+    def load_dirs(rows):
+        """Expand [parent index, suffix] rows back into full directory paths."""
+        paths = []
+        for parent, suffix in rows:
+            paths.append(suffix if parent < 0 else paths[parent] + suffix)
+        return paths
+
+    def to_json(self, file_ids=None):
+        """Return {"dirs": ..., "files": ...} for all files or just file_ids.
+
+        When file_ids is given, files are renumbered 0..n-1 in that order.
+        """
+        file_ids = range(len(self)) if file_ids is None else file_ids
+        rows, row_of = self.dump_dirs(self.file_dir[i] for i in file_ids)
+        files = [[row_of[self.file_dir[i]], self.file_name[i]] for i in file_ids]
+        return {"dirs": rows, "files": files}
+
+    @classmethod
+    def from_json(cls, data):
+        table = cls()
+        dir_ids = [table.add_dir(p) for p in cls.load_dirs(data["dirs"])]
+        for dir_row, name in data["files"]:
+            table.add_file(dir_ids[dir_row], name)
+        return table
+
+
+def _synthetic_paths(n_files, files_per_dir=200):
+    root = "E:/Pictures"
+    for i in range(n_files):
+        d = i // files_per_dir
+        yield os.path.join(root, str(2000 + d % 25), f"Camera Roll {d // 25 % 40:02d}", f"Album {d:06d}",
+                           f"IMG_{i:08d}.JPG")
+
+
+def benchmark_memory(n_files=2_000_000):
+    """Compare peak memory of path-string structures and the path table."""
+    import json
+    import tracemalloc
+    from collections import defaultdict
+
+    fake_hash = "a" * 64
+
+    tracemalloc.start()
+    cached_hashes = {p: fake_hash for p in _synthetic_paths(n_files)}
+    image_paths = list(_synthetic_paths(n_files))          # os.walk makes fresh strings
+    new_images = [p for p in image_paths if p not in cached_hashes]
+    hash_dict = defaultdict(list)
+    for i, (p, h) in enumerate(cached_hashes.items()):
+        hash_dict[f"{i // 2:064x}"].append(p)
+    _, old_peak = tracemalloc.get_traced_memory()
+    old_report = len(json.dumps(hash_dict, indent=2))
+    del cached_hashes, image_paths, new_images, hash_dict
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    table = PathTable()
+    hashes = []
+    for p in _synthetic_paths(n_files):
+        table.add(p)
+        hashes.append(fake_hash)
+    image_ids = array("I", (table.add(p) for p in _synthetic_paths(n_files)))
+    new_ids = [i for i in image_ids if hashes[i] is None]
+    id_groups = defaultdict(list)
+    for i in range(len(table)):
+        id_groups[f"{i // 2:064x}"].append(i)
+    _, new_peak = tracemalloc.get_traced_memory()
+    new_report = len(json.dumps(dict(table.to_json(), groups=id_groups), separators=(",", ":")))
+    tracemalloc.stop()
+
+    mb = 1024 * 1024
+    print(f"{n_files} files, {len(table.dir_paths)} directories")
+    print(f"  path strings: peak {old_peak / mb:8.1f} MB, report {old_report / mb:7.1f} MB")
+    print(f"  path table:   peak {new_peak / mb:8.1f} MB, report {new_report / mb:7.1f} MB")
+    return old_peak, new_peak
+
+
+if __name__ == "__main__":
+    import sys
+    benchmark_memory(int(sys.argv[1]) if len(sys.argv) > 1 else 2_000_000)
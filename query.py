@@ -0,0 +1,60 @@
+import json
+import time
+from functools import partial
+from multiprocessing import Pool
+
+from hashing import compute_hash, iter_images, DEFAULT_HASH, DEFAULT_HASH_SIZE
+from hamming_index import HammingIndex
+
+# --- CONFIGURATION ---
+HASH_CACHE_FILE = "image_hashes.json"
+MATCHES_FILE = "matches.json"
+
+
+def load_index(cache_file=HASH_CACHE_FILE, tolerance=0, hash_name=DEFAULT_HASH, hash_size=DEFAULT_HASH_SIZE):
+    """Load the archive hash cache and build the lookup index (of file ids) once."""
+    from Mark3 import load_cached_hashes
+
+    table, hashes = load_cached_hashes(cache_file, hash_name, hash_size)
+    return table, HammingIndex.from_hashes(dict(enumerate(hashes)), tolerance)
+
+
+def query(incoming_dir, cache_file=HASH_CACHE_FILE, tolerance=0, processes=4,
+          hash_name=DEFAULT_HASH, hash_size=DEFAULT_HASH_SIZE, stream=False):
+    """Hash only the incoming folder and look every file up in the archive.
+
+    Returns {incoming path: [{"path": archive path, "distance": bits}]} for
+    files that already exist in the archive. With stream=True each match is
+    printed as soon as its file has been hashed, while the folder is still
+    being walked.
+    """
+    start = time.perf_counter()
+    table, index = load_index(cache_file, tolerance, hash_name, hash_size)
+    print(f"Loaded {len(index)} archive hashes in {time.perf_counter() - start:.1f}s")
+
+    matches = {}
+    n_checked = 0
+    worker = partial(compute_hash, hash_name=hash_name, hash_size=hash_size)
+    with Pool(processes=processes) as pool:
+        # iter_images is lazy, so hashing starts before the walk has finished
+        for path, h in pool.imap_unordered(worker, iter_images(incoming_dir), chunksize=4):
+            n_checked += 1
+            if not h:
+                continue
+            found = index.query(h)
+            if not found:
+                continue
+            matches[path] = [{"path": table.path(i), "distance": d} for i, d in found]
+            if stream:
+                best, distance = found[0]
+                print(f"{path} -> {table.path(best)}" + (f" (distance {distance})" if distance else ""), flush=True)
+
+    print(f"\n{len(matches)} of {n_checked} incoming images already in the archive "
+          f"({time.perf_counter() - start:.1f}s)")
+    return matches
+
+
+def save_matches(matches, matches_file=MATCHES_FILE):
+    with open(matches_file, "w", encoding="utf-8") as f:
+        json.dump(matches, f, indent=2)
+    print(f"Match report saved to: {matches_file}")
@@ -0,0 +1,171 @@
+"""Read-ahead I/O stage feeding the hashing workers through shared memory.
+
+A small, bounded set of reader threads pulls files off the disk in
+directory/inode order (so spinning disks and SMB shares see mostly sequential
+reads) straight into a ring of `multiprocessing.shared_memory` slots. Decode
+workers attach to the slot by name and hash the bytes in place, so disk reads
+and CPU decoding overlap instead of every worker seeking on its own.
+"""
+import os
+import queue
+import threading
+from functools import partial
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+
+from hashing import hash_with_time, DEFAULT_HASH, DEFAULT_HASH_SIZE
+
+# --- CONFIGURATION ---
+N_READERS = 4                    # concurrent disk readers (1-2 for a single HDD)
+SLOT_SIZE = 16 * 1024 * 1024     # files larger than this are read by the worker itself
+SLOT_COVERAGE = 0.99             # slots are sized to hold this fraction of the files to hash
+
+
+class _BufferReader:
+    """Minimal read-only file object over a memoryview (no extra copy for PIL)."""
+    def __init__(self, view):
+        self.view = view
+        self.pos = 0
+
+    def read(self, n=-1):
+        end = len(self.view) if n is None or n < 0 else min(self.pos + n, len(self.view))
+        data = bytes(self.view[self.pos:end])
+        self.pos = end
+        return data
+
+    def seek(self, offset, whence=0):
+        if whence == 1:
+            offset += self.pos
+        elif whence == 2:
+            offset += len(self.view)
+        self.pos = max(0, offset)
+        return self.pos
+
+    def tell(self):
+        return self.pos
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def close(self):
+        self.view.release()
+
+
+# Shared-memory blocks attached by this worker process, by name
+_attached = {}
+
+
+def _attach(name):
+    shm = _attached.get(name)
+    if shm is None:
+        try:
+            shm = SharedMemory(name=name, track=False)   # Python 3.13+
+        except TypeError:
+            # Pool workers share the parent's resource tracker, which already
+            # owns the block and unlinks it once the scan is done
+            shm = SharedMemory(name=name)
+        _attached[name] = shm
+    return shm
+
+
+def _hash_slot(name, size, path, hash_name, hash_size):
+    """Pool worker: hash the image bytes sitting in shared-memory slot `name`."""
+    try:
+        reader = _BufferReader(_attach(name).buf[:size])
+    except Exception:
+        return hash_with_time(path, hash_name, hash_size)
+    try:
+        return hash_with_time(path, hash_name, hash_size, source=reader)
+    finally:
+        reader.close()
+
+
+def disk_order(paths):
+    """Sort paths by directory then inode, returning [(path, size)]."""
+    keyed = []
+    for path in paths:
+        try:
+            st = os.stat(path)
+            keyed.append((os.path.dirname(path), st.st_ino, path, st.st_size))
+        except OSError:
+            keyed.append((os.path.dirname(path), 0, path, -1))
+    keyed.sort()
+    return [(path, size) for _, _, path, size in keyed]
+
+
+def hash_files(paths, processes, readers=N_READERS, hash_name=DEFAULT_HASH,
+               hash_size=DEFAULT_HASH_SIZE, slot_size=SLOT_SIZE, n_slots=None):
+    """Yield (path, hash, capture time, thumbnail) for every path, reading ahead through shared memory.
+
+    At most n_slots files (default: two per worker) are held in memory at once,
+    which bounds both RAM use and how far the readers run ahead of decoding.
+    Slots are no bigger than needed for SLOT_COVERAGE of the files (and never
+    bigger than slot_size); the rest are read by the workers themselves.
+    """
+    ordered = disk_order(paths)
+    sizes = sorted(size for _, size in ordered if size >= 0)
+    if sizes:
+        slot_size = max(1, min(slot_size, sizes[min(len(sizes) - 1, int(len(sizes) * SLOT_COVERAGE))]))
+    n_slots = n_slots or processes * 2
+    slots = [SharedMemory(create=True, size=slot_size) for _ in range(n_slots)]
+    free = queue.Queue()
+    for i in range(n_slots):
+        free.put(i)
+    results = queue.Queue()
+    work = iter(ordered)
+    work_lock = threading.Lock()
+    direct = partial(hash_with_time, hash_name=hash_name, hash_size=hash_size)
+
+    def release(slot, result):
+        free.put(slot)
+        results.put(result)
+
+    def reader(pool):
+        while True:
+            with work_lock:
+                item = next(work, None)
+            if item is None:
+                return
+            path, size = item
+            if size < 0:
+                results.put((path, None, 0, None))
+                continue
+            if size > slot_size:
+                # Too big for a slot: let the worker read it itself
+                pool.apply_async(direct, (path,), callback=results.put,
+                                 error_callback=lambda e, p=path: results.put((p, None, 0, None)))
+                continue
+            slot = free.get()
+            try:
+                # readinto may return less than asked for (network shares, signals): read until full or EOF
+                n = 0
+                with open(path, "rb", buffering=0) as f:
+                    while n < size:
+                        got = f.readinto(slots[slot].buf[n:size])
+                        if not got:
+                            break
+                        n += got
+            except OSError:
+                release(slot, (path, None, 0, None))
+                continue
+            pool.apply_async(_hash_slot, (slots[slot].name, n, path, hash_name, hash_size),
+                             callback=partial(release, slot),
+                             error_callback=lambda e, s=slot, p=path: release(s, (p, None, 0, None)))
+
+    try:
+        with Pool(processes=processes) as pool:
+            threads = [threading.Thread(target=reader, args=(pool,), daemon=True)
+                       for _ in range(max(1, readers))]
+            for t in threads:
+                t.start()
+            for _ in range(len(ordered)):
+                yield results.get()
+            for t in threads:
+                t.join()
+    finally:
+        for shm in slots:
+            shm.close()
+            shm.unlink()
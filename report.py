@@ -0,0 +1,104 @@
+"""Reading and writing duplicates reports.
+
+Version 2 reports carry a path table (see path_table.py) and list each group
+as file ids:
+
+    {"version": 2, "dirs": [...], "files": [...], "groups": {"<hash>": [0, 1]},
+     "stats": {"<hash>": [members, total bytes, reclaimable bytes, max width, max height]}}
+
+The per-group stats are gathered once when the report is written (file
+sizes and image headers), so the reviewer can sort and filter the queue
+without touching the files. Version 1 reports are the original {"<hash>": ["E:/Pictures/...", ...]}
+mapping; load_report reads both.
+"""
+import io
+import os
+import json
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+from path_table import PathTable
+
+REPORT_VERSION = 2
+STATS_FIELDS = ("members", "total_bytes", "reclaimable_bytes", "max_width", "max_height")
+N_STAT_THREADS = 16
+
+
+def _file_info(path, data=None):
+    """(file size, width, height) from a stat and the image header; zeros if unreadable.
+
+    data holds the bytes of an archive member (see group_stats).
+    """
+    from PIL import Image
+
+    try:
+        size = len(data) if data is not None else os.path.getsize(path)
+    except Exception:
+        return 0, 0, 0
+    try:
+        with Image.open(io.BytesIO(data) if data is not None else path) as img:
+            return (size,) + img.size
+    except Exception:
+        return size, 0, 0
+
+
+def group_stats(table, groups):
+    """Return {key: [members, total bytes, reclaimable bytes, max width, max height]}.
+
+    Reclaimable bytes assume the largest file of each group is the one kept.
+    """
+    from archives import split_member, read_members
+
+    ids = sorted({i for members in groups.values() for i in members})
+    # Archive members: one pass per archive for all of its members
+    member_ids = {table.path(i): i for i in ids if split_member(table.path(i))[1] is not None}
+    info = {}
+    for path, data in read_members(member_ids):
+        info[member_ids[path]] = _file_info(path, data)
+    rest = [i for i in ids if i not in info]
+    with ThreadPoolExecutor(max_workers=N_STAT_THREADS) as pool:
+        info.update(zip(rest, pool.map(_file_info, (table.path(i) for i in rest))))
+    stats = {}
+    for key, members in groups.items():
+        sizes = [info[i][0] for i in members]
+        stats[key] = [len(members), sum(sizes), sum(sizes) - max(sizes),
+                      max(info[i][1] for i in members), max(info[i][2] for i in members)]
+    return stats
+
+
+def save_report(table, groups, report_file, with_stats=True):
+    """Write {key: [file ids]} groups with just the part of the table they use."""
+    used = [i for ids in groups.values() for i in ids]
+    row_of = {file_id: n for n, file_id in enumerate(used)}
+    report = {"version": REPORT_VERSION}
+    report.update(table.to_json(used))
+    report["groups"] = {key: [row_of[i] for i in ids] for key, ids in groups.items()}
+    if with_stats:
+        report["stats"] = group_stats(table, groups)
+    with open(report_file, "w", encoding="utf-8") as f:
+        json.dump(report, f, separators=(",", ":"))
+
+
+def save_path_groups(groups, report_file):
+    """Write {key: [paths]} groups in the version 2 format."""
+    table = PathTable()
+    save_report(table, {key: [table.add(p) for p in paths] for key, paths in groups.items()}, report_file)
+
+
+def load_report_table(report_file):
+    """Return (PathTable, OrderedDict key -> [file ids], {key: stats}) for either report version.
+
+    Reports written without stats (and version 1 reports) give an empty stats dict.
+    """
+    with open(report_file, "r", encoding="utf-8") as f:
+        data = json.load(f, object_pairs_hook=OrderedDict)
+    if data.get("version") == REPORT_VERSION:
+        return PathTable.from_json(data), data["groups"], data.get("stats", {})
+    table = PathTable()
+    return table, OrderedDict((key, [table.add(p) for p in paths]) for key, paths in data.items()), {}
+
+
+def load_report(report_file):
+    """Return OrderedDict key -> [paths] for either report version."""
+    table, groups, _ = load_report_table(report_file)
+    return OrderedDict((key, [table.path(i) for i in ids]) for key, ids in groups.items())
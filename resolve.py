@@ -0,0 +1,81 @@
+import os
+import shutil
+
+from report import load_report
+
+# Policies for picking the one file to keep in each duplicate group
+KEEP_POLICIES = {
+    "first": lambda paths: paths[0],
+    "largest": lambda paths: max(paths, key=_file_size),
+    "smallest": lambda paths: min(paths, key=_file_size),
+    "oldest": lambda paths: min(paths, key=_mtime),
+    "newest": lambda paths: max(paths, key=_mtime),
+    "shortest-path": lambda paths: min(paths, key=len),
+}
+
+
+def _file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return -1
+
+
+def _mtime(path):
+    try:
+        return os.path.getmtime(path)
+    except OSError:
+        return float("inf")
+
+
+def plan(duplicates, keep="largest"):
+    """Return a list of (keeper, [paths to remove]) for every group."""
+    choose = KEEP_POLICIES[keep]
+    actions = []
+    for paths in duplicates.values():
+        existing = [p for p in paths if os.path.exists(p)]
+        if len(existing) < 2:
+            continue
+        keeper = choose(existing)
+        actions.append((keeper, [p for p in existing if p != keeper]))
+    return actions
+
+
+def apply(actions, move_to=None):
+    """Delete (or move into move_to) every non-keeper. Returns bytes reclaimed."""
+    reclaimed = 0
+    for _, victims in actions:
+        for path in victims:
+            size = _file_size(path)
+            try:
+                if move_to:
+                    target = os.path.join(move_to, os.path.splitdrive(path)[1].lstrip("\\/"))
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    shutil.move(path, target)
+                else:
+                    os.remove(path)
+                reclaimed += max(size, 0)
+            except OSError as e:
+                print(f"Failed to remove {path}: {e}")
+    return reclaimed
+
+
+def resolve(duplicates_file, keep="largest", move_to=None, dry_run=True):
+    duplicates = load_report(duplicates_file)
+
+    actions = plan(duplicates, keep)
+    total = sum(max(_file_size(p), 0) for _, victims in actions for p in victims)
+    n_files = sum(len(victims) for _, victims in actions)
+
+    if dry_run:
+        for keeper, victims in actions:
+            print(f"KEEP   {keeper}")
+            for p in victims:
+                print(f"  drop {p}")
+        print(f"\n{n_files} files in {len(actions)} groups would free {total / (1024 * 1024):.1f} MB "
+              "(re-run with --apply to act)")
+        return 0
+
+    reclaimed = apply(actions, move_to)
+    print(f"Freed {reclaimed / (1024 * 1024):.1f} MB from {n_files} files.")
+    return reclaimed
@@ -0,0 +1,324 @@
+"""Long-running similarity lookup server.
+
+Loads the hash cache (and embeddings, if present) once, keeps the numeric
+indexes memory-mapped and answers lookups over localhost HTTP, so tools such
+as upload ingestion can ask "do we already have this?" without starting a
+script every time:
+
+    python imagesearch.py serve --port 8765
+    curl -d '{"hash": "d1c4...", "tolerance": 4}' localhost:8765/lookup/hash
+    curl -d '{"path": "/uploads/new.jpg"}' localhost:8765/lookup/image
+    curl localhost:8765/stats
+    curl -X POST localhost:8765/reload
+
+Concurrent near-duplicate and embedding lookups are micro-batched: requests
+that arrive within BATCH_WAIT_MS are answered by one vectorised scan over the
+index. The cache is re-read automatically when it changes on disk.
+"""
+import os
+import glob
+import json
+import time
+import queue
+import threading
+from collections import deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+# --- CONFIGURATION ---
+HASH_CACHE_FILE = "image_hashes.json"
+EMBEDDINGS_FILE = "embeddings.npy"
+EMBEDDING_PATHS_FILE = "embedding_paths.json"
+PORT = 8765
+MAX_BATCH = 64
+BATCH_WAIT_MS = 2          # how long the batcher waits for more requests to join a batch
+SCAN_CHUNK = 262144        # index rows compared per vectorised step
+RELOAD_CHECK_S = 10        # how often the cache mtime is checked for hot reload
+LATENCY_WINDOW = 10000     # latencies kept for the p50/p99 report
+
+
+def _hex_to_words(hex_hash, n_words):
+    # Zero-pad on the left to whole 64-bit words (e.g. hash size 12 = 144 bits = 36 hex chars)
+    hex_hash = hex_hash.zfill(n_words * 16)
+    return [int(hex_hash[i * 16:(i + 1) * 16], 16) for i in range(n_words)]
+
+
+def _bits_prefix(cache_file):
+    return os.path.splitext(cache_file)[0] + ".bits-"
+
+
+def _remove_stale_bits(cache_file, keep):
+    """Delete bits files of older snapshots (ones still mapped on Windows are left for next time)."""
+    for path in glob.glob(glob.escape(_bits_prefix(cache_file)) + "*.npy"):
+        if os.path.abspath(path) != os.path.abspath(keep):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+def _is_int(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+class IndexSnapshot:
+    """Immutable view of the indexes; a reload builds a new one and swaps it in."""
+    def __init__(self, cache_file=HASH_CACHE_FILE, embeddings_file=EMBEDDINGS_FILE,
+                 embedding_paths_file=EMBEDDING_PATHS_FILE, hash_name="phash", hash_size=16):
+        from Mark3 import load_cached_hashes
+
+        self.loaded_at = time.time()
+        st = os.stat(cache_file) if os.path.exists(cache_file) else None
+        self.cache_mtime = st.st_mtime if st else 0
+        # /lookup/image hashes with hash_name/hash_size, so the cache has to match them
+        table, hashes = load_cached_hashes(cache_file, hash_name, hash_size)
+        ids = [i for i, h in enumerate(hashes) if h]
+        self.paths = [table.path(i) for i in ids]
+        self.exact = {}
+        for row, i in enumerate(ids):
+            self.exact.setdefault(hashes[i], []).append(row)
+
+        # Hashes as N x words uint64, saved next to the cache and memory-mapped. Each
+        # cache version gets its own file: one that is mapped is never written again.
+        self.n_chars = len(hashes[ids[0]]) if ids else 0
+        self.n_words = -(-self.n_chars // 16)
+        stamp = f"{st.st_mtime_ns}-{st.st_size}-{self.n_words}w" if st else "empty"
+        self.bits_file = f"{_bits_prefix(cache_file)}{stamp}.npy"
+        if not os.path.exists(self.bits_file):
+            bits = np.array([_hex_to_words(hashes[i], self.n_words) for i in ids],
+                            dtype=np.uint64).reshape(len(ids), self.n_words)
+            tmp = self.bits_file + ".tmp"
+            with open(tmp, "wb") as f:
+                np.save(f, bits)
+            os.replace(tmp, self.bits_file)
+        self.bits = np.load(self.bits_file, mmap_mode="r")
+
+        self.embeddings = None
+        self.embedding_paths = []
+        if os.path.exists(embeddings_file) and os.path.exists(embedding_paths_file):
+            self.embeddings = np.load(embeddings_file, mmap_mode="r")
+            with open(embedding_paths_file, "r", encoding="utf-8") as f:
+                self.embedding_paths = json.load(f)
+
+    def hamming_batch(self, queries, tolerances, limits):
+        """Vectorised scan for a batch of hex hashes; returns [[(path, distance)]]."""
+        q = np.array([_hex_to_words(h, self.n_words) for h in queries], dtype=np.uint64)
+        found = [[] for _ in queries]
+        for start in range(0, len(self.bits), SCAN_CHUNK):
+            chunk = np.asarray(self.bits[start:start + SCAN_CHUNK])
+            dist = np.zeros((len(q), len(chunk)), dtype=np.uint16)
+            for w in range(self.n_words):
+                dist += np.bitwise_count(q[:, w:w + 1] ^ chunk[None, :, w]).astype(np.uint16)
+            for n, tol in enumerate(tolerances):
+                rows = np.nonzero(dist[n] <= tol)[0]
+                found[n].extend(zip((rows + start).tolist(), dist[n, rows].tolist()))
+        return [[(self.paths[r], d) for r, d in sorted(f, key=lambda m: m[1])[:limit]]
+                for f, limit in zip(found, limits)]
+
+    def embedding_batch(self, vectors, limits):
+        """Cosine top-k for a batch of vectors; returns [[(path, similarity)]]."""
+        q = np.asarray(vectors, dtype=np.float32)
+        q /= np.linalg.norm(q, axis=1, keepdims=True) + 1e-12
+        best = [[] for _ in vectors]
+        for start in range(0, len(self.embeddings), SCAN_CHUNK):
+            sims = q @ np.asarray(self.embeddings[start:start + SCAN_CHUNK]).T
+            for n, limit in enumerate(limits):
+                k = min(limit, sims.shape[1])
+                top = np.argpartition(-sims[n], k - 1)[:k]
+                best[n].extend(zip((top + start).tolist(), sims[n, top].tolist()))
+        return [[(self.embedding_paths[r], s) for r, s in sorted(b, key=lambda m: -m[1])[:limit]]
+                for b, limit in zip(best, limits)]
+
+
+class MicroBatcher:
+    """Collect concurrent requests for up to BATCH_WAIT_MS and answer them in one call."""
+    def __init__(self, handler, max_batch=MAX_BATCH, wait_ms=BATCH_WAIT_MS):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.wait = wait_ms / 1000
+        self.requests = queue.Queue()
+        self.batch_sizes = deque(maxlen=LATENCY_WINDOW)
+        threading.Thread(target=self._loop, daemon=True).start()
+
+    def submit(self, item):
+        future = Future()
+        self.requests.put((item, future))
+        return future.result()
+
+    def _loop(self):
+        while True:
+            batch = [self.requests.get()]
+            deadline = time.perf_counter() + self.wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.requests.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.batch_sizes.append(len(batch))
+            try:
+                results = self.handler([item for item, _ in batch])
+                for (_, future), result in zip(batch, results):
+                    future.set_result(result)
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+
+
+class LookupService:
+    """Lookup logic shared by the HTTP handler; owns the current index snapshot."""
+    def __init__(self, cache_file=HASH_CACHE_FILE, embeddings_file=EMBEDDINGS_FILE,
+                 embedding_paths_file=EMBEDDING_PATHS_FILE, hash_name="phash", hash_size=16):
+        self.files = (cache_file, embeddings_file, embedding_paths_file)
+        self.hash_name = hash_name
+        self.hash_size = hash_size
+        self.index = IndexSnapshot(*self.files, hash_name, hash_size)
+        _remove_stale_bits(cache_file, self.index.bits_file)
+        self.reload_lock = threading.Lock()
+        self.latencies = {}
+        self.hash_batcher = MicroBatcher(
+            lambda items: self.index.hamming_batch(*zip(*items)))
+        self.embedding_batcher = MicroBatcher(
+            lambda items: self.index.embedding_batch(*zip(*items)))
+
+    def reload(self):
+        """Rebuild the snapshot from disk and swap it in; lookups keep running meanwhile."""
+        with self.reload_lock:
+            self.index = IndexSnapshot(*self.files, self.hash_name, self.hash_size)
+            _remove_stale_bits(self.files[0], self.index.bits_file)
+        return {"hashes": len(self.index.paths), "embeddings": len(self.index.embedding_paths)}
+
+    def watch(self, interval=RELOAD_CHECK_S):
+        def loop():
+            while True:
+                time.sleep(interval)
+                cache_file = self.files[0]
+                try:
+                    if os.path.exists(cache_file) and os.path.getmtime(cache_file) > self.index.cache_mtime:
+                        self.reload()
+                except Exception as e:
+                    # Keep serving the old snapshot and try again on the next check
+                    print(f"⚠ Reload of {cache_file} failed: {e!r}")
+        threading.Thread(target=loop, daemon=True).start()
+
+    def _check_hash(self, hex_hash, tolerance, limit):
+        """Reject malformed lookups before they can join (and fail) a batch."""
+        n_chars = self.index.n_chars
+        if not isinstance(hex_hash, str) or len(hex_hash) != n_chars:
+            raise ValueError(f"hash must be a string of {n_chars} hex characters")
+        try:
+            int(hex_hash, 16)
+        except ValueError:
+            raise ValueError("hash is not hexadecimal") from None
+        if not _is_int(tolerance) or tolerance < 0:
+            raise ValueError("tolerance must be a non-negative integer")
+        if not _is_int(limit) or limit < 1:
+            raise ValueError("limit must be a positive integer")
+
+    def lookup_hash(self, hex_hash, tolerance=0, limit=20):
+        self._check_hash(hex_hash, tolerance, limit)
+        if tolerance == 0:
+            index = self.index
+            return [(index.paths[r], 0) for r in index.exact.get(hex_hash, [])[:limit]]
+        return self.hash_batcher.submit((hex_hash, tolerance, limit))
+
+    def lookup_image(self, path, tolerance=0, limit=20):
+        from hashing import compute_hash
+
+        _, h = compute_hash(path, self.hash_name, self.hash_size)
+        if h is None:
+            raise ValueError(f"could not read image {path}")
+        return h, self.lookup_hash(h, tolerance, limit)
+
+    def lookup_vector(self, vector, limit=10):
+        embeddings = self.index.embeddings
+        if embeddings is None:
+            raise ValueError("no embeddings loaded")
+        if (not isinstance(vector, list) or len(vector) != embeddings.shape[1]
+                or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in vector)):
+            raise ValueError(f"vector must be a list of {embeddings.shape[1]} numbers")
+        if not _is_int(limit) or limit < 1:
+            raise ValueError("limit must be a positive integer")
+        return self.embedding_batcher.submit((vector, limit))
+
+    def record(self, endpoint, seconds):
+        self.latencies.setdefault(endpoint, deque(maxlen=LATENCY_WINDOW)).append(seconds)
+
+    def stats(self):
+        report = {"hashes": len(self.index.paths), "embeddings": len(self.index.embedding_paths),
+                  "loaded_at": self.index.loaded_at, "endpoints": {}}
+        for endpoint, values in self.latencies.items():
+            ms = np.array(values) * 1000
+            report["endpoints"][endpoint] = {"count": len(ms), "p50_ms": round(float(np.percentile(ms, 50)), 3),
+                                             "p99_ms": round(float(np.percentile(ms, 99)), 3)}
+        for name, batcher in (("hash", self.hash_batcher), ("embedding", self.embedding_batcher)):
+            if batcher.batch_sizes:
+                report[f"{name}_mean_batch"] = round(float(np.mean(batcher.batch_sizes)), 2)
+        return report
+
+
+class _Handler(BaseHTTPRequestHandler):
+    service = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def _reply(self, code, payload):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(code)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == "/stats":
+            self._reply(200, self.service.stats())
+        else:
+            self._reply(404, {"error": "not found"})
+
+    def do_POST(self):
+        start = time.perf_counter()
+        length = int(self.headers.get("Content-Length") or 0)
+        try:
+            req = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(req, dict):
+                raise ValueError("request body must be a JSON object")
+            if self.path == "/lookup/hash":
+                matches = self.service.lookup_hash(req["hash"], req.get("tolerance", 0), req.get("limit", 20))
+                payload = {"matches": [{"path": p, "distance": d} for p, d in matches]}
+            elif self.path == "/lookup/image":
+                h, matches = self.service.lookup_image(req["path"], req.get("tolerance", 0), req.get("limit", 20))
+                payload = {"hash": h, "matches": [{"path": p, "distance": d} for p, d in matches]}
+            elif self.path == "/lookup/embedding":
+                matches = self.service.lookup_vector(req["vector"], req.get("limit", 10))
+                payload = {"matches": [{"path": p, "similarity": s} for p, s in matches]}
+            elif self.path == "/reload":
+                payload = self.service.reload()
+            else:
+                self._reply(404, {"error": "not found"})
+                return
+        except (KeyError, ValueError, TypeError) as e:
+            self._reply(400, {"error": str(e)})
+            return
+        self.service.record(self.path, time.perf_counter() - start)
+        self._reply(200, payload)
+
+
+def serve(host="127.0.0.1", port=PORT, **service_args):
+    service = LookupService(**service_args)
+    service.watch()
+    handler = type("Handler", (_Handler,), {"service": service})
+    server = ThreadingHTTPServer((host, port), handler)
+    print(f"Serving {len(service.index.paths)} hashes and {len(service.index.embedding_paths)} embeddings "
+          f"on http://{host}:{server.server_address[1]}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
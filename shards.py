@@ -0,0 +1,296 @@
+"""Sharded hash indexes that several machines can build in parallel.
+
+Each shard covers one root (a NAS volume, a mount, a machine's disk) and is
+written independently:
+
+    {"version": 2, "namespace": "nas1", "root": "//nas1/photos", "hash": "phash",
+     "hash_size": 16, "dirs": [...], "files": [...], "hashes": [...]}
+
+Paths are stored relative to the root (the shard's own path namespace) and
+entries are sorted by hash, so `merge` combines any number of shards with a
+streaming sort-merge into one duplicates report without rehashing. Shards
+made with different hash settings can't be compared and are refused.
+
+A small coordinator hands out directories to workers over a
+multiprocessing manager, so the workers can be local processes or run on
+other machines:
+
+    python imagesearch.py coordinate nas1=//nas1/photos nas2=//nas2/photos --local-workers 2
+    python imagesearch.py worker --connect coordinator-host:50505 --authkey <key>
+
+The manager exchanges pickles, so anyone holding the key can run code on the
+coordinator: without --authkey a random key is generated and printed, and
+the coordinator should only listen on a trusted network.
+
+Workers send a heartbeat while they hash a directory; directories of a
+worker that goes silent for WORKER_TIMEOUT_S are handed out again. A
+directory that fails (share offline, permission denied...) is retried up to
+MAX_ATTEMPTS times; directories that still fail are left out of the merged
+report, listed at the end, and `coordinate` exits with status 1.
+
+Workers write their shards straight into the coordinator's shard folder, so
+for remote workers it has to be a path they can all reach (a share).
+"""
+import os
+import json
+import heapq
+import time
+import queue
+import socket
+import secrets
+import threading
+from functools import partial
+from multiprocessing import Pool, Process
+from multiprocessing.managers import BaseManager, EventProxy
+
+from hashing import compute_hash, iter_images, check_hash_params, VALID_EXTS, DEFAULT_HASH, DEFAULT_HASH_SIZE
+from path_table import PathTable
+
+# --- CONFIGURATION ---
+SHARD_VERSION = 2
+SHARD_DIR = "shards"
+COORDINATOR_PORT = 50505
+HEARTBEAT_S = 10             # workers report in this often while hashing a directory
+WORKER_TIMEOUT_S = 120       # a worker silent for this long is presumed dead
+MAX_ATTEMPTS = 3             # times a failing directory is handed out before giving up on it
+
+
+# --- SHARD FILES ---
+def write_shard(shard_file, namespace, root, results, hash_name=DEFAULT_HASH, hash_size=DEFAULT_HASH_SIZE):
+    """Write [(absolute path, hash)] as a shard sorted by hash."""
+    table = PathTable()
+    entries = sorted((h, table.add(os.path.relpath(path, root))) for path, h in results if h)
+    shard = {"version": SHARD_VERSION, "namespace": namespace, "root": root,
+             "hash": hash_name, "hash_size": hash_size}
+    shard.update(table.to_json([file_id for _, file_id in entries]))
+    shard["hashes"] = [h for h, _ in entries]
+    os.makedirs(os.path.dirname(os.path.abspath(shard_file)), exist_ok=True)
+    tmp = shard_file + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(shard, f, separators=(",", ":"))
+    os.replace(tmp, shard_file)
+    return len(entries)
+
+
+def hash_tree(root, namespace, shard_file, processes=4, hash_name=DEFAULT_HASH,
+              hash_size=DEFAULT_HASH_SIZE, rel_dir="", recursive=True):
+    """Hash the images under root/rel_dir (or only directly in it) into one shard file."""
+    top = os.path.join(root, rel_dir)
+    if recursive:
+        paths = list(iter_images(top))
+    else:
+        paths = [os.path.join(top, f) for f in sorted(os.listdir(top))
+                 if os.path.splitext(f.lower())[1] in VALID_EXTS and os.path.isfile(os.path.join(top, f))]
+    worker = partial(compute_hash, hash_name=hash_name, hash_size=hash_size)
+    with Pool(processes=processes) as pool:
+        results = pool.map(worker, paths, chunksize=max(1, len(paths) // (processes * 4)))
+    return write_shard(shard_file, namespace, root, results, hash_name, hash_size)
+
+
+def _load_shard(shard_file):
+    with open(shard_file, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _iter_shard(shard, mounts):
+    """Yield (hash, absolute path) from a loaded shard in hash order."""
+    base = mounts.get(shard["namespace"], shard["root"])
+    dirs = PathTable.load_dirs(shard["dirs"])
+    for h, (dir_row, name) in zip(shard["hashes"], shard["files"]):
+        yield h, os.path.normpath(os.path.join(base, dirs[dir_row], name))
+
+
+def merge(shard_files, report_file, mounts=None):
+    """Sort-merge shards on hash and write one global duplicates report.
+
+    mounts maps a shard namespace to where its root is reachable from this
+    machine (defaults to the root recorded in the shard).
+    """
+    from report import save_report
+
+    mounts = mounts or {}
+    loaded = [_load_shard(f) for f in shard_files]
+    # Every shard has to use the hash settings of the first one that recorded them
+    recorded = next(([s["hash"], s["hash_size"]] for s in loaded if "hash" in s), None)
+    if recorded:
+        for shard_file, shard in zip(shard_files, loaded):
+            check_hash_params(shard_file, [shard["hash"], shard["hash_size"]] if "hash" in shard else None,
+                              shard["hashes"], *recorded)
+
+    table = PathTable()
+    duplicates = {}
+    current, group = None, []
+    for h, path in heapq.merge(*(_iter_shard(s, mounts) for s in loaded)):
+        if h != current:
+            if len(group) > 1:
+                duplicates[current] = [table.add(p) for p in group]
+            current, group = h, []
+        group.append(path)
+    if len(group) > 1:
+        duplicates[current] = [table.add(p) for p in group]
+
+    save_report(table, duplicates, report_file)
+    print(f"Merged {len(shard_files)} shards: {len(duplicates)} duplicate groups saved to {report_file}")
+    return duplicates
+
+
+# --- WORK-QUEUE COORDINATOR ---
+class _QueueManager(BaseManager):
+    pass
+
+
+def _work_units(roots):
+    """Split each root into directory units: its own files plus one per subdirectory."""
+    units = []
+    for namespace, root in roots:
+        units.append((namespace, root, "", False))
+        for entry in sorted(os.scandir(root), key=lambda e: e.name):
+            if entry.is_dir():
+                units.append((namespace, root, entry.name, True))
+    return units
+
+
+def _shard_name(namespace, rel_dir):
+    safe = "".join(c if c.isalnum() or c in "-_." else "_" for c in rel_dir) or "_root"
+    return f"{namespace}--{safe}.json"
+
+
+def run_worker(address, authkey, processes=4, name=None):
+    """Take directories from the coordinator until it reports that all are done.
+
+    Messages on the done queue are (kind, shard file, worker name, payload)
+    with kind "start", "alive", "done" (payload: hash count) or "error".
+    """
+    _QueueManager.register("get_work")
+    _QueueManager.register("get_done")
+    _QueueManager.register("get_finished", proxytype=EventProxy)
+    manager = _QueueManager(address=address, authkey=authkey)
+    manager.connect()
+    work, done, finished = manager.get_work(), manager.get_done(), manager.get_finished()
+    name = name or f"{socket.gethostname()}-{os.getpid()}"
+    while not finished.is_set():
+        try:
+            unit = work.get(timeout=1)
+        except queue.Empty:
+            continue
+        namespace, root, rel_dir, recursive, shard_file = unit
+        done.put(("start", shard_file, name, None))
+
+        # Heartbeat while hashing, so the coordinator can tell slow from dead
+        hashed = threading.Event()
+
+        def heartbeat():
+            while not hashed.wait(HEARTBEAT_S):
+                done.put(("alive", shard_file, name, None))
+
+        threading.Thread(target=heartbeat, daemon=True).start()
+        try:
+            n = hash_tree(root, namespace, shard_file, processes, rel_dir=rel_dir, recursive=recursive)
+            done.put(("done", shard_file, name, n))
+        except Exception as e:
+            done.put(("error", shard_file, name, repr(e)))
+        finally:
+            hashed.set()
+
+
+def coordinate(roots, shard_dir=SHARD_DIR, report_file="duplicates.json", local_workers=0,
+               processes=4, host="127.0.0.1", port=COORDINATOR_PORT, authkey=None, mounts=None):
+    """Hand out directory units to workers, then merge their shards.
+
+    roots is a list of (namespace, root path). Workers started elsewhere
+    connect with `imagesearch.py worker --connect host:port --authkey KEY`;
+    local_workers starts that many on this machine. Without authkey a
+    random one is generated and printed.
+
+    Returns (duplicates, failed) where failed lists the (namespace, root,
+    rel_dir) units that could not be hashed after MAX_ATTEMPTS tries.
+    """
+    if authkey is None:
+        authkey = secrets.token_hex(16).encode()
+        print(f"Worker key: {authkey.decode()}")
+    work, done, finished = queue.Queue(), queue.Queue(), threading.Event()
+    _QueueManager.register("get_work", callable=lambda: work)
+    _QueueManager.register("get_done", callable=lambda: done)
+    _QueueManager.register("get_finished", callable=lambda: finished, proxytype=EventProxy)
+    manager = _QueueManager(address=(host, port), authkey=authkey)
+    server = manager.get_server()
+    address = server.address
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    units = _work_units(roots)
+    os.makedirs(shard_dir, exist_ok=True)
+    pending = {}
+    for namespace, root, rel_dir, recursive in units:
+        shard_file = os.path.abspath(os.path.join(shard_dir, _shard_name(namespace, rel_dir)))
+        pending[shard_file] = (namespace, root, rel_dir, recursive, shard_file)
+        work.put(pending[shard_file])
+    print(f"Serving {len(units)} directories on {address[0]}:{address[1]}")
+
+    workers = [Process(target=run_worker, args=(address, authkey, processes, f"local-{i}"))
+               for i in range(local_workers)]
+    for p in workers:
+        p.start()
+
+    shard_files = []
+    failed = []
+    attempts = {}           # shard file -> failures so far
+    leases = {}             # shard file -> worker hashing it
+    last_seen = {}          # worker -> time of its last message
+    unclaimed_since = None  # when units went missing from the queue without a "start"
+    while pending:
+        try:
+            kind, shard_file, name, payload = done.get(timeout=HEARTBEAT_S)
+        except queue.Empty:
+            kind = None
+        now = time.monotonic()
+        if kind:
+            last_seen[name] = now
+        if kind == "start" and shard_file in pending:
+            leases[shard_file] = name
+        elif kind == "error" and shard_file in pending:
+            leases.pop(shard_file, None)
+            attempts[shard_file] = attempts.get(shard_file, 0) + 1
+            if attempts[shard_file] < MAX_ATTEMPTS:
+                print(f"⚠ {name} failed on {os.path.basename(shard_file)} "
+                      f"(attempt {attempts[shard_file]}/{MAX_ATTEMPTS}), requeueing: {payload}")
+                work.put(pending[shard_file])
+            else:
+                print(f"⚠ {name} failed on {os.path.basename(shard_file)}, giving up: {payload}")
+                failed.append(pending.pop(shard_file)[:3])
+        elif kind == "done" and shard_file in pending:
+            # A unit that was handed out again may report twice; the first answer wins
+            del pending[shard_file]
+            leases.pop(shard_file, None)
+            print(f"{name}: {payload} hashes -> {os.path.basename(shard_file)}")
+            shard_files.append(shard_file)
+
+        # Hand out the units of workers that went silent again
+        for shard_file, name in list(leases.items()):
+            if now - last_seen[name] > WORKER_TIMEOUT_S:
+                print(f"⚠ {name} stopped responding, requeueing {os.path.basename(shard_file)}")
+                del leases[shard_file]
+                work.put(pending[shard_file])
+        # A worker can die between taking a unit and reporting "start"
+        unclaimed = work.empty() and len(leases) < len(pending)
+        if not unclaimed:
+            unclaimed_since = None
+        elif unclaimed_since is None:
+            unclaimed_since = now
+        elif now - unclaimed_since > WORKER_TIMEOUT_S:
+            lost = pending.keys() - leases.keys()
+            print(f"⚠ {len(lost)} directories were taken by workers that never reported, requeueing")
+            for shard_file in lost:
+                work.put(pending[shard_file])
+            unclaimed_since = None
+
+    finished.set()
+    for p in workers:
+        p.join()
+
+    duplicates = merge(sorted(shard_files), report_file, mounts)
+    if failed:
+        print(f"⚠ {len(failed)} directories could not be hashed and are missing from {report_file}:")
+        for namespace, root, rel_dir in sorted(failed):
+            print(f"  {namespace}: {os.path.join(root, rel_dir)}")
+    return duplicates, failed
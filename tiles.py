@@ -0,0 +1,192 @@
+"""Tiled, lazily decoded image pyramid for the zoom/compare view.
+
+Only the part of an image that is on screen is decoded, at the resolution it
+is shown at:
+
+* level L of the pyramid is the image scaled by 1/2**L; JPEGs are decoded
+  straight at that size with PIL's draft mode (DCT scaling),
+* uncompressed/strip/tiled TIFFs are region-decoded at full resolution by
+  decoding only the TIFF tiles or strips that intersect the requested tile,
+  and their coarse levels are built a band of strips at a time,
+* other formats are decoded once per level and shrunk with Image.reduce
+  (box averaging) before the RGB conversion,
+* decoded tiles and whole levels share one LRU cache bounded by bytes.
+
+Nothing here touches Qt, so rendering can run in worker threads.
+"""
+import math
+import threading
+from collections import OrderedDict
+
+from PIL import Image, ImageChops
+
+TILE_SIZE = 256
+CACHE_MB = 256            # decoded tiles and pyramid levels kept across all open images
+DIFF_THRESHOLD = 24       # per-pixel difference shown at full strength in the overlay
+BACKGROUND = (48, 48, 48)
+
+
+class TileCache:
+    """Thread-safe LRU of decoded tiles and pyramid levels, bounded by total bytes."""
+    def __init__(self, max_bytes=CACHE_MB * 1024 * 1024):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.tiles = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            tile = self.tiles.get(key)
+            if tile is not None:
+                self.tiles.move_to_end(key)
+            return tile
+
+    def put(self, key, tile):
+        size = tile.width * tile.height * len(tile.getbands())
+        with self.lock:
+            if key in self.tiles:
+                return
+            self.tiles[key] = tile
+            self.bytes += size
+            while self.bytes > self.max_bytes and len(self.tiles) > 1:
+                _, old = self.tiles.popitem(last=False)
+                self.bytes -= old.width * old.height * len(old.getbands())
+
+
+shared_cache = TileCache()
+
+
+class TileSource:
+    """One image file seen as a pyramid of TILE_SIZE tiles."""
+    def __init__(self, path, cache=shared_cache):
+        self.path = path
+        self.cache = cache
+        self.lock = threading.Lock()
+        with Image.open(path) as img:
+            self.size = img.size
+            self.format = img.format
+            # Uncompressed TIFFs list one PIL tile per TIFF tile/strip; those can be decoded on their own
+            self.region_decodable = img.format == "TIFF" and len(img.tile) > 1
+        self.max_level = max(0, math.ceil(math.log2(max(self.size) / TILE_SIZE)))
+
+    def level_size(self, level):
+        return (max(1, math.ceil(self.size[0] / 2 ** level)), max(1, math.ceil(self.size[1] / 2 ** level)))
+
+    def level_for_scale(self, scale):
+        """Coarsest level that still has at least `scale` screen pixels per image pixel."""
+        if scale >= 1:
+            return 0
+        return min(self.max_level, int(math.floor(math.log2(1 / scale))))
+
+    def _level_image(self, level):
+        key = (self.path, "level", level)
+        img = self.cache.get(key)
+        if img is not None:
+            return img
+        with self.lock:
+            img = self.cache.get(key)       # another thread may have decoded it meanwhile
+            if img is not None:
+                return img
+            target = self.level_size(level)
+            img = None
+            if level and self.region_decodable:
+                try:
+                    img = self._reduce_bands(level, target)
+                except Exception:
+                    self.region_decodable = False
+            if img is None:
+                with Image.open(self.path) as src:
+                    if level:
+                        src.draft("RGB", target)  # JPEG: decode at 1/2, 1/4 or 1/8 size directly
+                    img = _shrink(src, target)
+            self.cache.put(key, img)
+            return img
+
+    def _reduce_bands(self, level, target):
+        """Build a coarse level of a strip/tiled TIFF one band of full-resolution rows at a time."""
+        factor = 2 ** level
+        width, height = self.size
+        band = factor * TILE_SIZE
+        img = Image.new("RGB", target)
+        for y in range(0, height, band):
+            part = self._decode_region((0, y, width, min(height, y + band))).reduce(factor)
+            img.paste(part, (0, y // factor))
+        return img
+
+    def _decode_region(self, box):
+        """Decode only the TIFF tiles/strips covering box (full resolution)."""
+        x0, y0, x1, y1 = box
+        with Image.open(self.path) as img:
+            tiles = [t for t in img.tile
+                     if t.extents[0] < x1 and t.extents[2] > x0 and t.extents[1] < y1 and t.extents[3] > y0]
+            bx0 = min(t.extents[0] for t in tiles)
+            by0 = min(t.extents[1] for t in tiles)
+            bx1 = max(t.extents[2] for t in tiles)
+            by1 = max(t.extents[3] for t in tiles)
+            img.tile = [t._replace(extents=(t.extents[0] - bx0, t.extents[1] - by0,
+                                            t.extents[2] - bx0, t.extents[3] - by0)) for t in tiles]
+            img._size = (bx1 - bx0, by1 - by0)
+            img.load()
+            return img.crop((x0 - bx0, y0 - by0, x1 - bx0, y1 - by0)).convert("RGB")
+
+    def tile(self, level, tx, ty):
+        key = (self.path, level, tx, ty)
+        tile = self.cache.get(key)
+        if tile is not None:
+            return tile
+        lw, lh = self.level_size(level)
+        box = (tx * TILE_SIZE, ty * TILE_SIZE, min(lw, (tx + 1) * TILE_SIZE), min(lh, (ty + 1) * TILE_SIZE))
+        tile = None
+        if level == 0 and self.region_decodable and self.cache.get((self.path, "level", 0)) is None:
+            try:
+                tile = self._decode_region(box)
+            except Exception:
+                self.region_decodable = False
+        if tile is None:
+            tile = self._level_image(level).crop(box)
+        self.cache.put(key, tile)
+        return tile
+
+    def render(self, rect, out_size):
+        """Render normalised rect (x0, y0, x1, y1 in 0..1 of the image) at out_size.
+
+        Returns (PIL RGB image, pyramid level used).
+        """
+        x0, y0, x1, y1 = rect
+        out_w, out_h = out_size
+        scale = out_w / max(1e-9, (x1 - x0) * self.size[0])
+        level = self.level_for_scale(scale)
+        lw, lh = self.level_size(level)
+        px0, py0, px1, py1 = x0 * lw, y0 * lh, x1 * lw, y1 * lh
+
+        # Paste every visible tile into a canvas covering the requested region
+        ox, oy = math.floor(px0), math.floor(py0)
+        canvas = Image.new("RGB", (max(1, math.ceil(px1) - ox), max(1, math.ceil(py1) - oy)), BACKGROUND)
+        for ty in range(max(0, oy // TILE_SIZE), min(math.ceil(lh / TILE_SIZE), math.ceil(py1 / TILE_SIZE))):
+            for tx in range(max(0, ox // TILE_SIZE), min(math.ceil(lw / TILE_SIZE), math.ceil(px1 / TILE_SIZE))):
+                canvas.paste(self.tile(level, tx, ty), (tx * TILE_SIZE - ox, ty * TILE_SIZE - oy))
+        region = canvas.resize((out_w, out_h), Image.BILINEAR,
+                               box=(px0 - ox, py0 - oy, px1 - ox, py1 - oy))
+        return region, level
+
+
+def _shrink(img, target):
+    """img as RGB at target size, box-reducing by the largest whole factor first."""
+    factor = max(1, min(img.width // target[0], img.height // target[1]))
+    if factor > 1:
+        try:
+            img = img.reduce(factor)
+        except ValueError:
+            img = img.convert("RGB").reduce(factor)   # modes reduce() can't average (P, I;16, ...)
+    img = img.convert("RGB")
+    if img.size != target:
+        img = img.resize(target, Image.BILINEAR)
+    return img
+
+
+def diff_overlay(a, b, threshold=DIFF_THRESHOLD):
+    """Tint pixels of a red where b differs (both already rendered at the same size)."""
+    diff = ImageChops.difference(a, b).convert("L")
+    mask = diff.point(lambda v: min(255, v * 255 // threshold))
+    red = Image.new("RGB", a.size, (255, 0, 0))
+    return Image.composite(red, a.convert("L").convert("RGB"), mask)
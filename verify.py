@@ -0,0 +1,220 @@
+"""Pixel-level verification of duplicate groups from small cached decodes.
+
+Hash groups (especially with HAMMING_TOLERANCE > 0) can hold images that
+only look alike to the hash. This stage confirms or splits every group by
+comparing THUMB_SIZE x THUMB_SIZE grayscale thumbnails:
+
+1. thumbnails are cached in THUMBS_DIR as one memory-mapped array. scan
+   keeps them while hashing (hashing.hash_with_time: with phash 16 they are
+   the very image the hash is computed from); only images hashed before
+   that are decoded here, once, in JPEG draft mode,
+2. for each group, block-wise SSIM between all members is computed with
+   NumPy broadcasting, a chunk of rows of the members x members matrix at
+   a time (SSIM_CHUNK_BYTES bounds the temporaries for huge groups),
+3. members linked by SSIM >= SSIM_THRESHOLD stay together; everything else
+   is dropped from the group. Groups are verified in parallel.
+
+The originals are never decoded again once their thumbnail is cached.
+"""
+import os
+import json
+from multiprocessing import Pool
+
+import numpy as np
+from PIL import Image
+
+from hashing import THUMB_SIZE
+
+# --- CONFIGURATION ---
+THUMBS_DIR = "thumbs"
+BLOCK = 8                 # SSIM is computed on BLOCK x BLOCK windows and averaged
+SSIM_THRESHOLD = 0.95
+SSIM_C1 = (0.01 * 255) ** 2
+SSIM_C2 = (0.03 * 255) ** 2
+SSIM_CHUNK_BYTES = 32 * 1024 * 1024   # per g x blocks temporary while comparing a chunk of rows
+
+
+# --- THUMBNAIL CACHE ---
+def make_thumb(image_path, data=None):
+    """Return (path, THUMB_SIZE x THUMB_SIZE uint8 grayscale array) or (path, None).
+
+    Only for images hashed before scan kept thumbnails; data holds the bytes
+    of an archive member (see update_thumbs).
+    """
+    import io
+
+    try:
+        with Image.open(io.BytesIO(data) if data is not None else image_path) as img:
+            img.draft("L", (THUMB_SIZE * 2, THUMB_SIZE * 2))
+            img = img.convert("L").resize((THUMB_SIZE, THUMB_SIZE), Image.LANCZOS)
+            return (image_path, np.asarray(img, dtype=np.uint8))
+    except Exception:
+        return (image_path, None)
+
+
+def load_thumbs(thumbs_dir=THUMBS_DIR, mmap=True):
+    """Return (paths, N x THUMB_SIZE x THUMB_SIZE uint8 array)."""
+    if not os.path.exists(os.path.join(thumbs_dir, "paths.json")):
+        return [], np.zeros((0, THUMB_SIZE, THUMB_SIZE), np.uint8)
+    with open(os.path.join(thumbs_dir, "paths.json"), "r", encoding="utf-8") as f:
+        paths = json.load(f)
+    thumbs = np.load(os.path.join(thumbs_dir, "thumbs.npy"), mmap_mode="r" if mmap else None)
+    return paths, thumbs
+
+
+def append_thumbs(items, thumbs_dir=THUMBS_DIR):
+    """Add (path, thumbnail or None) pairs to the cache; returns how many were stored.
+
+    New thumbnails are streamed to a raw temp file and then copied after the
+    cached ones into a new memory-mapped thumbs.npy, so a full scan never
+    holds them all in memory. Paths already cached get their thumbnail
+    replaced (e.g. members of a changed archive).
+    """
+    paths, old = load_thumbs(thumbs_dir)
+    row_of = {p: n for n, p in enumerate(paths)}
+    os.makedirs(thumbs_dir, exist_ok=True)
+    raw_file = os.path.join(thumbs_dir, "new.raw")
+    new_paths, replaced = [], {}
+    with open(raw_file, "wb") as f:
+        for path, thumb in items:
+            if thumb is None:
+                continue
+            if path in row_of:
+                replaced[row_of[path]] = thumb
+            else:
+                row_of[path] = len(paths) + len(new_paths)
+                new_paths.append(path)
+                f.write(np.ascontiguousarray(thumb, dtype=np.uint8).tobytes())
+    try:
+        if not new_paths and not replaced:
+            return 0
+        tmp = os.path.join(thumbs_dir, "thumbs.tmp.npy")
+        shape = (len(paths) + len(new_paths), THUMB_SIZE, THUMB_SIZE)
+        out = np.lib.format.open_memmap(tmp, mode="w+", dtype=np.uint8, shape=shape)
+        out[:len(paths)] = old
+        if new_paths:
+            out[len(paths):] = np.memmap(raw_file, np.uint8, "r", shape=(len(new_paths), THUMB_SIZE, THUMB_SIZE))
+        for row, thumb in replaced.items():
+            out[row] = thumb
+        out.flush()
+        del out, old          # Windows can't replace a file that is still mapped
+        os.replace(tmp, os.path.join(thumbs_dir, "thumbs.npy"))
+        with open(os.path.join(thumbs_dir, "paths.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump(paths + new_paths, f)
+        os.replace(os.path.join(thumbs_dir, "paths.json.tmp"), os.path.join(thumbs_dir, "paths.json"))
+        return len(new_paths) + len(replaced)
+    finally:
+        os.remove(raw_file)
+
+
+def update_thumbs(image_paths, thumbs_dir=THUMBS_DIR, processes=4):
+    """Decode thumbnails for images scan did not keep one for and append them."""
+    from tqdm import tqdm
+    from archives import split_member, read_members
+
+    paths, _ = load_thumbs(thumbs_dir)
+    known = set(paths)
+    new_images = [p for p in dict.fromkeys(image_paths) if p not in known]
+    print(f"{len(new_images)} new thumbnails to decode, using {processes} cores...")
+    if not new_images:
+        return
+
+    members = [p for p in new_images if split_member(p)[1] is not None]
+    files = [p for p in new_images if split_member(p)[1] is None]
+
+    def decode():
+        with Pool(processes=processes) as pool:
+            yield from tqdm(pool.imap_unordered(make_thumb, files, chunksize=16), total=len(files))
+        # Archive members are decoded here, reading each archive once
+        for path, data in read_members(members):
+            yield make_thumb(path, data)
+
+    append_thumbs(decode(), thumbs_dir)
+
+
+# --- VERIFICATION ---
+def iter_ssim_rows(stack):
+    """Yield (first row, rows x g mean block SSIM) for a g x H x W stack, a chunk of rows at a time."""
+    g, h, w = stack.shape
+    blocks = stack.astype(np.float32).reshape(g, h // BLOCK, BLOCK, w // BLOCK, BLOCK)
+    blocks = blocks.transpose(0, 1, 3, 2, 4).reshape(g, -1, BLOCK * BLOCK)   # g x blocks x pixels
+    mu = blocks.mean(axis=2)
+    centred = blocks - mu[:, :, None]
+    var = (centred ** 2).mean(axis=2)
+    # Temporaries are chunk x g x blocks, so memory stays flat however big the group is
+    chunk = max(1, SSIM_CHUNK_BYTES // (4 * g * mu.shape[1]))
+    for start in range(0, g, chunk):
+        rows = slice(start, start + chunk)
+        # Covariance of each row member with every member, block by block
+        cov = np.einsum("ibk,jbk->ijb", centred[rows], centred) / (BLOCK * BLOCK)
+        mu_i, mu_j = mu[rows, None, :], mu[None, :, :]
+        ssim = ((2 * mu_i * mu_j + SSIM_C1) * (2 * cov + SSIM_C2)) / \
+               ((mu_i ** 2 + mu_j ** 2 + SSIM_C1) * (var[rows, None, :] + var[None, :, :] + SSIM_C2))
+        yield start, ssim.mean(axis=2)
+
+
+def ssim_matrix(stack):
+    """Mean block SSIM between every pair of a g x H x W stack; returns g x g."""
+    return np.concatenate([rows for _, rows in iter_ssim_rows(stack)])
+
+
+# Thumbnail array opened (memory-mapped) once per worker
+_thumbs = {}
+
+
+def _init_worker(thumbs_dir):
+    _thumbs["array"] = load_thumbs(thumbs_dir)[1]
+
+
+def verify_group(task):
+    """Split one group into the sets of members confirmed by SSIM; returns (key, [[positions]])."""
+    key, rows = task
+    positions = [n for n, row in enumerate(rows) if row is not None]
+    if len(positions) < 2:
+        return key, []
+    stack = np.asarray(_thumbs["array"][[rows[n] for n in positions]])
+
+    # Connected components of the "looks the same" graph
+    parent = list(range(len(positions)))
+
+    def find(x):
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for start, ssim in iter_ssim_rows(stack):
+        linked = np.triu(ssim >= SSIM_THRESHOLD, start + 1)    # each pair once, no self-links
+        for a, b in zip(*np.nonzero(linked)):
+            parent[find(start + a)] = find(b)
+    parts = {}
+    for n in range(len(positions)):
+        parts.setdefault(find(n), []).append(positions[n])
+    return key, [p for p in parts.values() if len(p) > 1]
+
+
+def verify_duplicates(table, groups, thumbs_dir=THUMBS_DIR, processes=4):
+    """Return groups ({key: [file ids]}) with members that fail SSIM removed.
+
+    A group that splits into several confirmed sets keeps its key for the
+    first and gets "key/2", "key/3"... for the others.
+    """
+    if not groups:
+        return {}
+    update_thumbs([table.path(i) for ids in groups.values() for i in ids], thumbs_dir, processes)
+    paths, _ = load_thumbs(thumbs_dir)
+    row_of = {p: n for n, p in enumerate(paths)}
+    tasks = [(key, [row_of.get(table.path(i)) for i in ids]) for key, ids in groups.items()]
+
+    confirmed = {}
+    with Pool(processes=processes, initializer=_init_worker, initargs=(thumbs_dir,)) as pool:
+        for key, parts in pool.imap_unordered(verify_group, tasks, chunksize=16):
+            confirmed[key] = parts
+
+    verified = {}
+    for key, ids in groups.items():
+        for n, part in enumerate(confirmed[key], 1):
+            verified[key if n == 1 else f"{key}/{n}"] = [ids[p] for p in part]
+    dropped = sum(len(ids) for ids in groups.values()) - sum(len(ids) for ids in verified.values())
+    print(f"Verified {len(groups)} groups: {len(verified)} confirmed, {dropped} files rejected.")
+    return verified